@@ -1,5 +1,6 @@
 import csv
 import datetime
+import functools
 import glob
 import inspect
 import logging
@@ -13,8 +14,13 @@ from pyaro.timeseries import (
     NpStructuredData,
     Station,
 )
-import pyaro.timeseries.Filter
-import xarray as xr
+from pyaro_readers.netcdf_helpers import (
+    NcFileCache,
+    decode_cf_times,
+    time_envelope,
+    time_index_range,
+)
+from pyaro_readers.parallel_helpers import ordered_map
 
 logger = logging.getLogger(__name__)
 
@@ -31,12 +37,18 @@ class Ascii2NetcdfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
         60 * 60 * 24 * 28: "monthly",
         60 * 60 * 24 * 365: "yearly",
     }
+    # maximum number of grid-cells read at once in sparse mode
+    SPARSE_BLOCK_CELLS = 1024 * 1024
+    # number of yearly files kept open between calls
+    MAX_OPEN_FILES = 16
 
     def __init__(
         self,
         filename,
         resolution="daily",
         filters=[],
+        sparse=True,
+        workers=1,
     ):
         """Initialize/open a new reader for netcdf-files converted from EBAS NASA-Ames-files
         with niluNasaAmes2netcdf.pl.
@@ -47,8 +59,18 @@ class Ascii2NetcdfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
             The resolutions are already merged in the conversion from ascii to netcdf, e.g. daily
             contains the accumulated hourly data, too.
         :param filters: list of filters, defaults to []
+        :param sparse: read only the valid cells of the [station][time] grids, block by block
+            along the netcdf-chunks of the station dimension, defaults to True.
+            Memory then scales with the number of observations rather than the grid size.
+        :param workers: number of processes reading the yearly files in parallel, None or 0
+            meaning one per cpu, defaults to 1
         """
         self._set_filters(filters)
+        self._sparse = sparse
+        self._workers = workers
+        self._ncfiles = NcFileCache(self.MAX_OPEN_FILES)
+        self._catalog = {}  # file -> header information
+        self._revision = None  # memoized revision of metadata()
         if os.path.isdir(filename):
             self._directory = filename
         else:
@@ -88,64 +110,107 @@ class Ascii2NetcdfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
         return
 
     def iterate_files(self):
-        for y in self._years:
+        for y in sorted(self._years):
             file_path = os.path.join(self._directory, f"data_{self._resolution}.{y}.nc")
             if os.path.exists(file_path):
                 yield file_path
 
     def metadata(self):
         metadata = dict()
-        date = datetime.datetime.min
-        for f in self.iterate_files():
-            with xr.open_dataset(f) as d:
-                hist: str = d.attrs.get("last_changed", "")
+        if self._revision is None:
+            # last_changed is part of the header-information read when opening
+            date = datetime.datetime.min
+            for f in self.iterate_files():
+                hist: str = self._file_catalog(f)["last_changed"]
 
                 datestr = hist.split("//")[0]
                 new_date = datetime.datetime.strptime(datestr, "%a %b %d %H:%M:%S %Y")
                 if new_date > date:
                     date = new_date
+            self._revision = datetime.datetime.strftime(date, "%y%m%d%H%M%S")
 
-        metadata["revision"] = datetime.datetime.strftime(date, "%y%m%d%H%M%S")
+        metadata["revision"] = self._revision
 
         return metadata
 
     def _is_year_in_filters(self, year):
         start_year = np.datetime64(f"{year}-01-01 00:00:00")
         end_year = np.datetime64(f"{year}-12-31 23:59:59")
-        time_filter = pyaro.timeseries.Filter.TimeBoundsFilter()
-        for fil in self._get_filters():
-            if isinstance(fil, pyaro.timeseries.Filter.TimeBoundsFilter):
-                time_filter = fil
-        if time_filter.has_envelope():
-            start, end = time_filter.envelope()
+        envelope = time_envelope(self._get_filters())
+        if envelope is not None:
+            start, end = envelope
             if end_year < start:
                 return False
             if end < start_year:
                 return False
         return True
 
+    def _file_catalog(self, file) -> dict:
+        """header-information of a yearly file, read only once per reader
+
+        :param file: yearly file
+        :return: dict with variables (varname -> (EPDL-name, units)), stations, start_times,
+            end_times and last_changed
+        """
+        if file not in self._catalog:
+            nc = self._ncfiles.get(file)
+            variables = {}
+            for vname, var in nc.variables.items():
+                if vname.startswith("EPDL"):
+                    varname = f"{var.component}_in_{var.matrix}"
+                    units = "1"
+                    if "units" in var.ncattrs():
+                        units = var.units
+                    variables[varname] = (vname, units)
+            start_times = decode_cf_times(
+                nc["time"][:],
+                nc["time"].units,
+                getattr(nc["time"], "calendar", "standard"),
+            )
+            last_changed = ""
+            if "last_changed" in nc.ncattrs():
+                last_changed = nc.getncattr("last_changed")
+            self._catalog[file] = {
+                "variables": variables,
+                "stations": np.array(netCDF4.chartostring(nc["station"][:]), dtype=str),
+                "start_times": start_times,
+                "end_times": self._end_times(start_times),
+                "last_changed": last_changed,
+            }
+        return self._catalog[file]
+
+    def _end_times(self, start_times):
+        """end-times of the time-steps, i.e. the start of the following time-step,
+        the last time-step has the length of the previous or the nominal resolution
+
+        :param start_times: start-times of a yearly file
+        :return: end-times
+        """
+        if len(start_times) > 1:
+            last_step = start_times[-1] - start_times[-2]
+        else:
+            resolution_seconds = {v: k for k, v in self.RESOLUTIONS.items()}
+            last_step = datetime.timedelta(seconds=resolution_seconds[self._resolution])
+        return np.append(start_times[1:], start_times[-1:] + last_step)
+
     def _read_file_variables(self):
         variables = {}
-        for year in self._years:
+        for year in sorted(self._years):
             file = os.path.join(self._directory, f"data_{self._resolution}.{year}.nc")
             if not os.path.exists(file):
                 logger.info(
                     f"no datafile for {year} and {self._resolution} at {file}, skipping..."
                 )
                 continue
-            with netCDF4.Dataset(file, "r") as nc:
-                for vname, var in nc.variables.items():
-                    if vname.startswith("EPDL"):
-                        varname = f"{var.component}_in_{var.matrix}"
-                        units = "1"
-                        if "units" in var.ncattrs():
-                            units = var.units
-                        if varname in variables:
-                            if units != variables[varname][1]:
-                                logger.warning(
-                                    f"units changed from {variables[varname][1]} to {units} for {varname}/{vname} in {file}"
-                                )
-                        variables[varname] = (vname, units)
+            for varname, (vname, units) in self._file_catalog(file)[
+                "variables"
+            ].items():
+                if varname in variables:
+                    if units != variables[varname][1]:
+                        logger.warning(
+                            f"units changed from {variables[varname][1]} to {units} for {varname}/{vname} in {file}"
+                        )
+                variables[varname] = (vname, units)
         return variables
 
     def _read_station_list(self, file):
@@ -178,84 +243,180 @@ class Ascii2NetcdfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
                     )
         return stations
 
-    def _get_data_from_ncfile(self, varname, file, data):
-        with netCDF4.Dataset(file, "r") as nc:
-            start_times = netCDF4.num2date(nc["time"][:], nc["time"].units)
-            end_times = start_times + (start_times[1] - start_times[0])
-            stations = nc["station"][:]
-            (epdl, _) = self._variables[varname]
-            if not epdl in nc.variables:
-                return
-            vdata = np.ma.filled(nc[epdl][:], np.nan)
-            if "units" in nc[epdl].ncattrs():
-                if nc[epdl].units != data.units:
-                    logger.warning(
-                        f"units-change for {varname} in {file}: {nc[epdl].units} != {data.units}"
-                    )
+    def _station_blocks(self, var, valid_stations):
+        """Split the station dimension of a [station][time] variable into blocks
+        of at most SPARSE_BLOCK_CELLS cells. The blocks are a whole number of netcdf-chunks
+        of var, unless a single chunk is larger, e.g. for files chunked along time.
+        Only the hyperslabs of the valid stations within a block are returned, e.g. only
+        one row when reading a single station.
+
+        :param var: netcdf-variable with dimensions [station][time]
+        :param valid_stations: boolean array, True for stations to read
+        :return: generator of slices along the station dimension
+        """
+        (nstations, ntimes) = var.shape
+        chunking = var.chunking()
+        step = max(1, self.SPARSE_BLOCK_CELLS // max(1, ntimes))
+        if chunking != "contiguous" and chunking is not None and chunking[0] <= step:
+            step -= step % chunking[0]
+        for start in range(0, nstations, step):
+            stop = min(start + step, nstations)
+            stat_idx = np.nonzero(valid_stations[start:stop])[0] + start
+            if len(stat_idx) == 0:
+                continue
+            if 2 * len(stat_idx) >= stop - start:
+                # mostly valid stations, read the block at once
+                yield slice(stat_idx[0], stat_idx[-1] + 1)
+                continue
+            # few stations, read each run of neighbouring stations
+            runs = np.split(stat_idx, np.nonzero(np.diff(stat_idx) > 1)[0] + 1)
+            for run in runs:
+                yield slice(run[0], run[-1] + 1)
+
+    def _read_dense_grid(self, var, valid_stations, time_slice):
+        """read the full [station][time] grid and return indices and values of valid cells
+
+        :param var: netcdf-variable with dimensions [station][time]
+        :param valid_stations: boolean array, True for stations with known position
+        :param time_slice: slice of the time dimension to read
+        :return: station-indices, time-indices and values of valid cells
+        """
+        vdata = np.ma.filled(var[:, time_slice], np.nan)
+        idx = np.isfinite(vdata) & valid_stations[:, np.newaxis]
+        (stat_idx, time_idx) = np.nonzero(idx)
+        return (stat_idx, time_idx + time_slice.start, vdata[idx])
+
+    def _read_sparse_grid(self, var, valid_stations, time_slice):
+        """read the [station][time] grid block by block, keeping only valid cells
+
+        The peak memory is given by one block and the valid cells, and the result is
+        identical to _read_dense_grid.
 
-            # get all arrays into same size, time fastes moving, i.e. [station][time]
-            dstruct = {}
-            dstruct["start_times"] = np.tile(start_times, vdata.shape[0])
-            dstruct["end_times"] = np.tile(end_times, vdata.shape[0])
+        :param var: netcdf-variable with dimensions [station][time]
+        :param valid_stations: boolean array, True for known stations passing the filters
+        :param time_slice: slice of the time dimension to read
+        :return: station-indices, time-indices and values of valid cells
+        """
+        stat_idxs = []
+        time_idxs = []
+        values = []
+        for block in self._station_blocks(var, valid_stations):
+            vdata = np.ma.filled(var[block, time_slice], np.nan)
+            idx = np.isfinite(vdata) & valid_stations[block, np.newaxis]
+            (stat_idx, time_idx) = np.nonzero(idx)
+            stat_idxs.append(stat_idx + block.start)
+            time_idxs.append(time_idx + time_slice.start)
+            values.append(vdata[idx])
+        if len(values) == 0:
+            return (np.empty(0, int), np.empty(0, int), np.empty(0, var.dtype))
+        return (
+            np.concatenate(stat_idxs),
+            np.concatenate(time_idxs),
+            np.concatenate(values),
+        )
+
+    def _station_positions(self, file):
+        """latitudes, longitudes and altitudes of the stations in a yearly file,
+        NaN for unknown or filtered stations
+
+        :param file: yearly file
+        :return: tuple of arrays of latitudes, longitudes and altitudes
+        """
+        catalog = self._file_catalog(file)
+        if "positions" not in catalog:
+            stations = self.stations()
             lats = []
             lons = []
             alts = []
-            stats = []
-            for i in range(stations.shape[0]):
-                station = str(netCDF4.chartostring(stations[i]))
-                if not station in self.stations():
+            for station in catalog["stations"]:
+                if not station in stations:
                     lats.append(np.nan)
                     lons.append(np.nan)
                     alts.append(np.nan)
-                    stats.append(station)
                 else:
                     stat = self._stations[station]
                     lats.append(stat.latitude)
                     lons.append(stat.longitude)
                     alts.append(stat.altitude)
-                    stats.append(station)
-            lat = np.array(lats)
-            lon = np.array(lons)
-            alt = np.array(alts)
-            dstruct["stations"] = np.repeat(stats, vdata.shape[1])
-            dstruct["lats"] = np.repeat(lat, vdata.shape[1])
-            dstruct["lons"] = np.repeat(lon, vdata.shape[1])
-            dstruct["alts"] = np.repeat(alt, vdata.shape[1])
-            dstruct["data"] = vdata.flatten()
-
-            # filter out undefined data or stations
-            idx = np.isfinite(dstruct["data"]) & np.isfinite(dstruct["lats"])
-            for key in dstruct.keys():
-                dstruct[key] = dstruct[key][idx]
-
-            dstruct["flags"] = np.zeros(len(dstruct["data"]), "i4")
-            dstruct["flags"][:] = Flag.VALID
-
-            data.append(
-                dstruct["data"],
-                dstruct["stations"],
-                dstruct["lats"],
-                dstruct["lons"],
-                dstruct["alts"],
-                dstruct["start_times"],
-                dstruct["end_times"],
-                dstruct["flags"],
-                dstruct["data"] * np.nan,
+            catalog["positions"] = (np.array(lats), np.array(lons), np.array(alts))
+        return catalog["positions"]
+
+    def _get_data_from_ncfile(self, varname, units, file):
+        """read the valid data of varname from one yearly file
+
+        :return: list of data-columns in the order of NpStructuredData.append,
+            or None if varname is not in file
+        """
+        catalog = self._file_catalog(file)
+        if not varname in catalog["variables"]:
+            return None
+        (epdl, file_units) = catalog["variables"][varname]
+        if file_units != units:
+            logger.warning(
+                f"units-change for {varname} in {file}: {file_units} != {units}"
+            )
+        nc = self._ncfiles.get(file)
+        start_times = catalog["start_times"]
+        end_times = catalog["end_times"]
+        stats = catalog["stations"]
+        (lat, lon, alt) = self._station_positions(file)
+
+        # data is stored as [station][time], only defined data at known, unfiltered
+        # stations is read
+        valid_stations = np.isfinite(lat)
+        # only read the time-steps within the time-filter
+        time_slice = time_index_range(
+            start_times, end_times, time_envelope(self._get_filters())
+        )
+        if time_slice.start == time_slice.stop:
+            return None
+        if self._sparse:
+            (stat_idx, time_idx, values) = self._read_sparse_grid(
+                nc[epdl], valid_stations, time_slice
             )
-            return
+        else:
+            (stat_idx, time_idx, values) = self._read_dense_grid(
+                nc[epdl], valid_stations, time_slice
+            )
+
+        flags = np.zeros(len(values), "i4")
+        flags[:] = Flag.VALID
+
+        return [
+            values,
+            stats[stat_idx],
+            lat[stat_idx],
+            lon[stat_idx],
+            alt[stat_idx],
+            start_times[time_idx],
+            end_times[time_idx],
+            flags,
+            values * np.nan,
+        ]
 
     def _unfiltered_data(self, varname) -> Data:
         (_, units) = self._variables[varname]
         data = NpStructuredData(varname, units)
 
-        for year in self._years:
+        files = []
+        for year in sorted(self._years):
             file = os.path.join(self._directory, f"data_{self._resolution}.{year}.nc")
             if not os.path.exists(file):
                 logger.info(
                     f"no datafile for {year} and {self._resolution} at {file}, skipping..."
                 )
                 continue
-            self._get_data_from_ncfile(varname, file, data)
+            files.append(file)
+
+        # read the years in parallel, but concatenate in order of the years
+        results = ordered_map(
+            functools.partial(self._get_data_from_ncfile, varname, units),
+            files,
+            self._workers,
+        )
+        results = [columns for columns in results if columns is not None]
+        if len(results) > 0:
+            data.append(*[np.concatenate(column) for column in zip(*results)])
 
         return data
 
@@ -266,7 +427,7 @@ class Ascii2NetcdfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
         return list(self._variables.keys())
 
     def close(self):
-        pass
+        self._ncfiles.close()
 
 
 class Ascii2NetcdfTimeseriesEngine(AutoFilterReaderEngine.AutoFilterEngine):
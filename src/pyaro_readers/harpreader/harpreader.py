@@ -1,5 +1,7 @@
+import functools
 import glob
 import inspect
+import json
 from pyaro.timeseries import (
     AutoFilterReaderEngine,
     Station,
@@ -9,11 +11,17 @@ from pyaro.timeseries import (
 )
 import logging
 import os
+import netCDF4
 import xarray as xr
 import numpy as np
 from pathlib import Path
-from tqdm import tqdm
 import cfunits
+from pyaro_readers.netcdf_helpers import (
+    decode_cf_times,
+    time_envelope,
+    time_index_range,
+)
+from pyaro_readers.parallel_helpers import ordered_map
 from pyaro_readers.units_helpers import UALIASES
 import datetime
 
@@ -24,9 +32,43 @@ class HARPReaderException(Exception):
     pass
 
 
+def _pyaro_units(units: str) -> str:
+    """Units of a HARP variable as understood by cfunits, or their alias."""
+    # Units in pyaro arte by definition strings, but this way
+    # we can make sure that cfunits understands them
+    units = str(cfunits.Units(units))
+    return UALIASES.get(units, units)
+
+
+def _station_name(file: str) -> str:
+    # take station name from filename since there is no name in the data...
+    return os.path.basename(file).split("-")[2]
+
+
 class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
     """
     Reader for netCDF files which follow the HARP convention.
+
+    Parameters:
+    -----------
+    file : Path | str
+        A HARP file or a directory of HARP files.
+    filters :
+        The pyaro filters.
+    vars_to_read : list[str]
+        The variables to read, defaults to None, i.e. all variables.
+    workers : int
+        The number of processes decoding the files of a directory in parallel,
+        None or 0 meaning one per cpu, defaults to 1. Files which cannot be
+        read are skipped with a warning.
+    catalog : bool
+        Read only the headers of the files when opening, and load the data of
+        a variable when it is first requested, defaults to False. The headers
+        are cached in the sidecar index CATALOG_FILE next to the files, and
+        are re-read only for files with changed modification time or size.
+
+    Only the time-slice of the envelope of a TimeBoundsFilter is loaded from
+    each file. In catalog mode, files outside the envelope are not opened.
     """
 
     FILE_MASK = "*.nc"
@@ -37,12 +79,17 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
         "datetime_start",
         "datetime_stop",
     ]
+    # sidecar index of the file headers, in the directory of the files
+    CATALOG_FILE = ".pyaro_harp_catalog.json"
+    CATALOG_VERSION = 2
 
     def __init__(
         self,
         file: Path | str,
         filters=[],
         vars_to_read: list[str] = None,
+        workers: int = 1,
+        catalog: bool = False,
     ):
         self._filters = filters
         realpath = Path(file).resolve()
@@ -50,6 +97,12 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
         self._data = {}
         self._files = []
         self._stations = {}
+        self._variables = {}
+        self._catalog = None
+        # history attribute of the readable files, captured when reading them
+        self._histories = {}
+        self._revision = None
+        self._workers = workers
         self._vars_to_read = vars_to_read
         self._set_filters(filters)
 
@@ -67,56 +120,233 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
         else:
             raise HARPReaderException(f"No such file or directory: {file}")
 
+        # errors of single files in a directory are logged, not raised
+        self._skip_errors = os.path.isdir(file)
         if os.path.isdir(file):
+            self._catalog_dir = file
             pattern = os.path.join(file, self.FILE_MASK)
-            self._files = glob.glob(pattern)
+            # sorted for a deterministic order of the records
+            self._files = sorted(glob.glob(pattern))
         else:
+            self._catalog_dir = os.path.dirname(os.path.abspath(file))
             self._files.append(file)
 
-        bar = tqdm(total=len(self._files), disable=None)
-
-        for f_idx, _file in enumerate(self._files):
-            logger.info(f"Reading {_file}")
-            bar.update(1)
-            self._variables = self._read_file_variables(_file)
-            # initialise all variables if not done yet
-            for _var in self._variables:
-                # skip coordinate names
-                if _var in self.COORD_NAMES:
-                    continue
-                if vars_to_read is not None and _var not in vars_to_read:
-                    logger.info(f"Skipping {_var}")
-                    continue
-                if _var not in self._data:
-                    units = self._variables[_var]
-                    data = NpStructuredData(_var, units)
-                    self._data[_var] = data
-
-                self._get_data_from_single_file(
-                    _file,
-                    _var,
-                )
-        bar.close()
+        if catalog:
+            self._read_catalog()
+        else:
+            # decode the files in parallel, but merge them in the order of the files
+            results = ordered_map(
+                self._read_single_file, self._files, workers, progress="HARP files"
+            )
+            self._merge_files(self._files, results)
+
+    def _is_in_time_envelope(self, entry: dict) -> bool:
+        """Tests if the time-range of a catalog entry overlaps the TimeBoundsFilter."""
+        envelope = time_envelope(self._get_filters())
+        if envelope is None or entry["time_range"] is None:
+            return True
+        (start, end) = (np.datetime64(t) for t in entry["time_range"])
+        return start <= envelope[1] and end >= envelope[0]
+
+    def _merge_files(self, files: list[str], results: list):
+        """Concatenates the data-columns of the files once per variable.
+
+        Parameters:
+        -----------
+        files : list[str]
+            The file paths.
+        results : list
+            The results of _read_single_file for the files.
+
+        """
+        columns = {}
+        for _file, result in zip(files, results):
+            if result is None:
+                continue
+            (variables, file_columns, history, station) = result
+            self._histories[_file] = history
+            if len(file_columns) > 0:
+                self._add_station(*station)
+            for _var, var_columns in file_columns.items():
+                if _var not in self._variables:
+                    self._variables[_var] = variables[_var]
+                elif variables[_var] != self._variables[_var]:
+                    logger.warning(
+                        f"units-change for {_var} in {_file}: {variables[_var]} != {self._variables[_var]}"
+                    )
+                columns.setdefault(_var, []).append(var_columns)
+
+        for _var, var_columns in columns.items():
+            data = NpStructuredData(_var, self._variables[_var])
+            data.append(
+                **{
+                    key: np.concatenate([c[key] for c in var_columns])
+                    for key in var_columns[0]
+                }
+            )
+            self._data[_var] = data
+
+    def _read_catalog(self):
+        """Fills variables and stations from the file headers.
+
+        Headers are taken from the sidecar index if modification time and size
+        of the file are unchanged, the other files are scanned and the index
+        is updated.
+        """
+        index_file = os.path.join(self._catalog_dir, self.CATALOG_FILE)
+        index = {}
+        try:
+            with open(index_file, "r") as fh:
+                index = json.load(fh)
+            if index.get("version") != self.CATALOG_VERSION:
+                index = {}
+        except (OSError, ValueError) as ex:
+            logger.debug(f"no catalog index {index_file}: {ex}")
+        entries = index.get("files", {})
+
+        stats = {}
+        stale = []
+        for _file in self._files:
+            stat = os.stat(_file)
+            stats[_file] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            entry = entries.get(os.path.basename(_file))
+            if entry is None or any(entry[k] != v for k, v in stats[_file].items()):
+                stale.append(_file)
+        if len(stale) > 0:
+            headers = ordered_map(
+                self._scan_header, stale, self._workers, progress="HARP headers"
+            )
+            for _file, header in zip(stale, headers):
+                if header is not None:
+                    entries[os.path.basename(_file)] = stats[_file] | header
+            # forget files which do not exist anymore
+            entries = {
+                name: entry
+                for name, entry in entries.items()
+                if os.path.exists(os.path.join(self._catalog_dir, name))
+            }
+            self._write_catalog_index(
+                index_file, {"version": self.CATALOG_VERSION, "files": entries}
+            )
+
+        self._catalog = {}
+        for _file in self._files:
+            entry = entries.get(os.path.basename(_file))
+            if entry is None:
+                continue
+            self._catalog[_file] = entry
+            self._histories[_file] = entry["attributes"].get("history", "")
+            variables = {
+                vname: units
+                for vname, units in entry["variables"].items()
+                if self._vars_to_read is None or vname in self._vars_to_read
+            }
+            for vname, units in variables.items():
+                self._variables.setdefault(vname, units)
+            if len(variables) > 0:
+                self._add_station(_station_name(_file), **entry["station"])
+
+    def _write_catalog_index(self, index_file: str, index: dict):
+        """Replaces the sidecar index atomically, if the directory is writable."""
+        tmpfile = f"{index_file}.{os.getpid()}"
+        try:
+            with open(tmpfile, "w") as fh:
+                json.dump(index, fh)
+            os.replace(tmpfile, index_file)
+        except OSError as ex:
+            logger.info(f"unable to write catalog index {index_file}: {ex}")
+
+    def _scan_header(self, file: str) -> dict | None:
+        """Reads the header and the scalar station coordinates of a file.
+
+        Parameters:
+        -----------
+        file : str
+            The file path.
+
+        Returns:
+        --------
+        dict | None :
+            The units of the variables, the station coordinates, the global
+            attributes and the time-range, or None if the file of a directory
+            cannot be read.
+
+        """
+        logger.info(f"Scanning {file}")
+        try:
+            with netCDF4.Dataset(file, "r") as nc:
+                if getattr(nc, "Conventions", None) != "HARP-1.0":
+                    raise ValueError(f"File {file} is not a HARP file.")
+                return {
+                    "variables": {
+                        vname: _pyaro_units(var.units)
+                        for vname, var in nc.variables.items()
+                        if vname not in self.COORD_NAMES
+                    },
+                    "station": {
+                        coord: float(nc[coord][...])
+                        for coord in ("latitude", "longitude", "altitude")
+                    },
+                    "attributes": {
+                        name: value
+                        for name in nc.ncattrs()
+                        if isinstance(value := nc.getncattr(name), str)
+                    },
+                    "time_range": self._scan_time_range(nc),
+                }
+        except Exception as ex:
+            if not self._skip_errors:
+                raise
+            logger.warning(f"Skipping unreadable file {file}: {ex}")
+            return None
+
+    def _scan_time_range(self, nc: netCDF4.Dataset) -> list[str] | None:
+        """Earliest start and latest stop of the observations of a file."""
+        (start, stop) = (
+            decode_cf_times(nc[name][:], nc[name].units)
+            for name in ("datetime_start", "datetime_stop")
+        )
+        if len(start) == 0:
+            return None
+        if np.all(start == stop):
+            # as for the data, equal start and stop are assumed to be hourly
+            stop = stop + np.timedelta64(1, "h")
+        return [str(np.min(start)), str(np.max(stop))]
+
+    def __getstate__(self):
+        # worker-processes decode files, they need neither the loaded data nor
+        # the catalog, histories and stations of all files
+        state = self.__dict__.copy()
+        state["_data"] = {}
+        state["_catalog"] = None
+        state["_histories"] = {}
+        state["_stations"] = {}
+        return state
 
     def metadata(self):
         metadata = dict()
-        date = datetime.datetime.min
-        for f in self._files:
-            with xr.open_dataset(f) as d:
-                hist: str = d.attrs.get("history", "")
-
+        if self._revision is None:
+            # from the history captured when opening, files are not read again
+            date = datetime.datetime.min
+            for hist in self._histories.values():
                 datestr = ":".join(hist.split(":")[:3])
                 new_date = datetime.datetime.strptime(datestr, "%a %b %d %H:%M:%S %Y")
                 if new_date > date:
                     date = new_date
+            self._revision = datetime.datetime.strftime(date, "%y%m%d%H%M%S")
 
-        metadata["revision"] = datetime.datetime.strftime(date, "%y%m%d%H%M%S")
+        metadata["revision"] = self._revision
 
         return metadata
 
-    def _read_file_variables(self, filename) -> dict[str, str]:
+    def _read_file_variables(self, dt: xr.Dataset) -> dict[str, str]:
         """Returns a mapping of variable name to unit for the dataset.
 
+        Parameters:
+        -----------
+        dt : xr.Dataset
+            The opened file.
+
         Returns:
         --------
         dict[str, str] :
@@ -124,48 +354,96 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
 
         """
         variables = {}
-        with xr.open_dataset(
-            filename,
-            decode_cf=False,
-        ) as d:
-            for vname, var in d.data_vars.items():
-                if vname in self._vars_to_read:
-                    # Units in pyaro arte by definition strings, but this way
-                    # we can make sure that cfunits understands them
-                    # otherwise variables[vname] = var.attrs["units"] should work as well
-                    variables[vname] = str(cfunits.Units(var.attrs["units"]))
-                    if variables[vname] in UALIASES:
-                        variables[vname] = UALIASES[variables[vname]]
+        for vname, var in dt.data_vars.items():
+            if vname in self.COORD_NAMES:
+                continue
+            if self._vars_to_read is None or vname in self._vars_to_read:
+                variables[vname] = _pyaro_units(var.attrs["units"])
 
         return variables
 
-    def _get_data_from_single_file(
+    def _read_single_file(
         self,
         file: str,
-        varname: str,
-    ) -> bool:
-        """Loads data for a variable from a single file.
+        varnames: list[str] | None = None,
+    ) -> tuple[dict[str, str], dict[str, dict[str, np.ndarray]], str, tuple] | None:
+        """Decodes a single file, opening it once.
 
         Parameters:
         -----------
         file : str
             The file path.
-        varname : str
-            The variable name.
-        data : NpStructuredData
-            Data instance to which the data will be appended to in-place.
+        varnames : list[str] | None
+            Decode only these variables, defaults to None, i.e. all variables
+            to read.
+
+        Returns:
+        --------
+        tuple[dict[str, str], dict[str, dict[str, np.ndarray]], str, tuple] | None :
+            The units and the data-columns of each variable, the history
+            attribute and the station name and coordinates, or None if the
+            file of a directory cannot be read.
 
         """
-        dt = xr.load_dataset(file)
+        logger.info(f"Reading {file}")
+        try:
+            # open each file once, lazily, and load only the needed variables
+            with xr.open_dataset(file) as dt:
+                variables = self._read_file_variables(dt)
+                if varnames is not None:
+                    variables = {
+                        vname: units
+                        for vname, units in variables.items()
+                        if vname in varnames
+                    }
+                columns = self._get_data_from_single_file(dt, file, list(variables))
+                history = dt.attrs.get("history", "")
+                station = (
+                    _station_name(file),
+                    dt["latitude"].item(),
+                    dt["longitude"].item(),
+                    dt["altitude"].item(),
+                )
+        except Exception as ex:
+            if not self._skip_errors:
+                raise
+            logger.warning(f"Skipping unreadable file {file}: {ex}")
+            return None
+        return (variables, columns, history, station)
+
+    def _get_data_from_single_file(
+        self,
+        dt: xr.Dataset,
+        file: str,
+        varnames: list[str],
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """Loads data for the variables from a single file.
+
+        The coordinates are read once and shared by all variables, only the
+        requested variables are loaded from the file, and of these only the
+        time-slice of the TimeBoundsFilter if the times are sorted.
+
+        Parameters:
+        -----------
+        dt : xr.Dataset
+            The opened file.
+        file : str
+            The file path.
+        varnames : list[str]
+            The variable names.
+
+        Returns:
+        --------
+        dict[str, dict[str, np.ndarray]] :
+            The data-columns of each variable, keyed by the arguments of
+            NpStructuredData.append.
 
+        """
         if dt.attrs.get("Conventions", None) != "HARP-1.0":
             raise ValueError(f"File {file} is not a HARP file.")
 
-        values = dt[varname].to_numpy()
-        # take station name from filename since there is no name in the data...
-        stat_name = os.path.basename(file).split("-")[2]
+        stat_name = _station_name(file)
 
-        values_length = len(values)
         start_time = np.asarray(dt["datetime_start"])
         stop_time = np.asarray(dt["datetime_stop"])
         # start and stop time have been the same in the 1st data revision
@@ -173,34 +451,48 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
         t_diff = stop_time - start_time
         if t_diff.sum() == 0:
             stop_time = stop_time + np.timedelta64(1, "h")
-        lat = np.asarray([dt["latitude"]] * values_length)
-        long = np.asarray([dt["longitude"]] * values_length)
-        station = np.asarray([stat_name] * values_length)
-        altitude = np.asarray([dt["altitude"]] * values_length)
-
-        flags = np.asarray([Flag.VALID] * values_length)
-        self._data[varname].append(
-            value=values,
-            station=station,
-            latitude=lat,
-            longitude=long,
-            altitude=altitude,
-            start_time=start_time,
-            end_time=stop_time,
-            # TODO: Currently assuming that all observations are valid.
-            flag=flags,
-            standard_deviation=np.asarray([np.nan] * values_length),
-        )
-
-        # fill self._stations
+        rec = slice(0, len(start_time))
+        envelope = time_envelope(self._get_filters())
+        if envelope is not None and np.all(start_time[1:] >= start_time[:-1]):
+            rec = time_index_range(start_time, stop_time, envelope)
+        start_time = start_time[rec]
+        stop_time = stop_time[rec]
+        values_length = len(start_time)
+        # constant columns are read-only views of a single value, they are
+        # only copied when concatenated into the data
+        lat = np.broadcast_to(np.float32(dt["latitude"].item()), values_length)
+        long = np.broadcast_to(np.float32(dt["longitude"].item()), values_length)
+        station = np.broadcast_to(np.str_(stat_name), values_length)
+        altitude = np.broadcast_to(np.float32(dt["altitude"].item()), values_length)
+
+        flags = np.broadcast_to(np.int16(Flag.VALID), values_length)
+        stddev = np.broadcast_to(np.float32(np.nan), values_length)
+        columns = {}
+        for varname in varnames:
+            columns[varname] = dict(
+                # values in their native dtype, usually float32
+                value=dt[varname][rec].to_numpy(),
+                station=station,
+                latitude=lat,
+                longitude=long,
+                altitude=altitude,
+                start_time=start_time,
+                end_time=stop_time,
+                # TODO: Currently assuming that all observations are valid.
+                flag=flags,
+                standard_deviation=stddev,
+            )
+        return columns
 
+    def _add_station(self, stat_name: str, latitude, longitude, altitude):
+        """Fills self._stations with the station of a single file."""
         if not stat_name in self._stations:
             self._stations[stat_name] = Station(
                 {
                     "station": stat_name,
-                    "longitude": long[0],
-                    "latitude": lat[0],
-                    "altitude": altitude[0],
+                    "longitude": float(longitude),
+                    "latitude": float(latitude),
+                    "altitude": float(altitude),
                     "country": "NN",
                     "url": "",
                     "long_name": stat_name,
@@ -214,9 +506,32 @@ class AeronetHARPReader(AutoFilterReaderEngine.AutoFilterReader):
         list[str]
             The list of variable names.
         """
-        return self._data.keys()
+        return list(self._variables)
 
     def _unfiltered_data(self, varname) -> Data:
+        if (
+            self._catalog is not None
+            and varname not in self._data
+            and varname in self._variables
+        ):
+            # catalog mode, load the variable from the files containing it,
+            # self._variables holds only the variables to read
+            files = [
+                _file
+                for _file, entry in self._catalog.items()
+                if varname in entry["variables"] and self._is_in_time_envelope(entry)
+            ]
+            results = ordered_map(
+                functools.partial(self._read_single_file, varnames=[varname]),
+                files,
+                self._workers,
+                progress=f"HARP {varname}",
+            )
+            self._merge_files(files, results)
+            if varname not in self._data:
+                self._data[varname] = NpStructuredData(
+                    varname, self._variables[varname]
+                )
         return self._data[varname]
 
     def _unfiltered_stations(self) -> dict[str, Station]:
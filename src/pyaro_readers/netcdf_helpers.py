@@ -0,0 +1,222 @@
+from collections import OrderedDict
+import functools
+import logging
+import re
+
+import netCDF4
+import numpy as np
+import pyaro.timeseries.Filter
+
+from pyaro_readers.parallel_helpers import ordered_map
+
+logger = logging.getLogger(__name__)
+
+# calendars which can be represented by numpy.datetime64 (proleptic gregorian)
+NUMPY_CALENDARS = ["standard", "gregorian", "proleptic_gregorian"]
+# calendars whose dates all exist in the proleptic gregorian calendar, i.e. their
+# dates can be converted to numpy.datetime64 one by one
+GREGORIAN_DATE_CALENDARS = ["noleap", "365_day", "all_leap", "366_day"]
+# start of the gregorian calendar, the standard calendar is julian before
+GREGORIAN_START = np.datetime64("1582-10-15 00:00:00", "s")
+
+CF_TIME_UNITS = {
+    "seconds": 1,
+    "second": 1,
+    "secs": 1,
+    "sec": 1,
+    "s": 1,
+    "minutes": 60,
+    "minute": 60,
+    "mins": 60,
+    "min": 60,
+    "hours": 60 * 60,
+    "hour": 60 * 60,
+    "hrs": 60 * 60,
+    "hr": 60 * 60,
+    "h": 60 * 60,
+    "days": 60 * 60 * 24,
+    "day": 60 * 60 * 24,
+    "d": 60 * 60 * 24,
+}
+
+_CF_REFTIME = re.compile(
+    r"^(?P<date>-?\d{1,4}-\d{1,2}-\d{1,2})"
+    r"(?:[T ](?P<time>\d{1,2}:\d{1,2}(?::\d{1,2}(?:\.\d*)?)?))?"
+    r"\s*(?P<tz>Z|UTC|[+-]\d{1,2}(?::?\d{2})?)?$"
+)
+
+
+class NcFileCache:
+    """LRU-cache of open, read-only netCDF4.Dataset handles
+
+    :param maxsize: maximum number of files kept open, defaults to 16
+    """
+
+    def __init__(self, maxsize=16):
+        self._maxsize = max(1, maxsize)
+        self._handles = OrderedDict()
+
+    def get(self, file) -> netCDF4.Dataset:
+        """get the open handle of file, opening it if needed
+
+        :param file: filename
+        :return: a netCDF4.Dataset opened for reading
+        """
+        if file in self._handles:
+            self._handles.move_to_end(file)
+            return self._handles[file]
+        logger.debug(f"opening {file}")
+        nc = netCDF4.Dataset(file, "r")
+        self._handles[file] = nc
+        while len(self._handles) > self._maxsize:
+            (_, old_nc) = self._handles.popitem(last=False)
+            old_nc.close()
+        return nc
+
+    def close(self):
+        """close all open files"""
+        for nc in self._handles.values():
+            nc.close()
+        self._handles.clear()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __getstate__(self):
+        # open handles cannot be shared with other processes, they get their own
+        return {"_maxsize": self._maxsize, "_handles": OrderedDict()}
+
+
+def _global_attributes(names, file) -> dict:
+    with netCDF4.Dataset(file, "r") as nc:
+        return {name: nc.getncattr(name) for name in names if name in nc.ncattrs()}
+
+
+def read_global_attributes(files, names, workers=1) -> list[dict]:
+    """Read only some global attributes of netcdf-files, without decoding
+    any variables.
+
+    :param files: list of filenames
+    :param names: names of the attributes, missing attributes are skipped
+    :param workers: number of processes reading the files in parallel, None or 0
+        meaning one per cpu, defaults to 1
+    :return: list of dicts of attribute-name and value, in the order of files
+    """
+    return ordered_map(functools.partial(_global_attributes, names), files, workers)
+
+
+def time_envelope(filters) -> tuple[np.datetime64, np.datetime64] | None:
+    """earliest and latest time of the TimeBoundsFilter in filters
+
+    :param filters: filters of a reader, e.g. from reader._get_filters()
+    :return: tuple of start and end as datetime64[s], or None if there is no envelope
+    """
+    time_filter = pyaro.timeseries.Filter.TimeBoundsFilter()
+    for fil in filters:
+        if isinstance(fil, pyaro.timeseries.Filter.TimeBoundsFilter):
+            time_filter = fil
+    if time_filter.has_envelope():
+        return tuple(np.datetime64(t, "s") for t in time_filter.envelope())
+    return None
+
+
+def time_index_range(start_times, end_times, envelope) -> slice:
+    """Index-range of observations which might be within the envelope of a
+    TimeBoundsFilter, found by binary search.
+
+    The range is a superset, exact filtering is still needed afterwards.
+
+    :param start_times: start-times of the observations, sorted ascending
+    :param end_times: end-times of the observations
+    :param envelope: tuple of earliest and latest time, or None for all observations
+    :return: slice of the observations
+    """
+    if envelope is None or len(start_times) == 0:
+        return slice(0, len(start_times))
+    (start, end) = envelope
+    # the end-times might not be sorted, but their running maximum is
+    latest_end = np.maximum.accumulate(end_times)
+    first = int(np.searchsorted(latest_end, start, side="left"))
+    last = int(np.searchsorted(start_times, end, side="right"))
+    return slice(first, max(first, last))
+
+
+def _parse_cf_time_units(units):
+    """parse CF time-units like 'days since 1900-01-01 00:00:00 +00:00'
+
+    :return: tuple of seconds per unit and reference time as datetime64[s],
+        or None if the units cannot be parsed
+    """
+    try:
+        (unit, reftime) = units.split(" since ")
+    except ValueError:
+        return None
+    unit = unit.strip().lower()
+    match = _CF_REFTIME.match(reftime.strip())
+    if unit not in CF_TIME_UNITS or match is None:
+        return None
+    (year, month, day) = match.group("date").rsplit("-", 2)
+    (hour, minute, second) = (0, 0, 0.0)
+    if match.group("time") is not None:
+        hms = match.group("time").split(":")
+        (hour, minute) = (int(hms[0]), int(hms[1]))
+        if len(hms) > 2:
+            second = float(hms[2])
+    reference = np.datetime64(
+        f"{int(year):04d}-{int(month):02d}-{int(day):02d}", "s"
+    ) + np.timedelta64(hour * 3600 + minute * 60 + round(second), "s")
+    tz = match.group("tz")
+    if tz is not None and tz not in ("Z", "UTC"):
+        sign = -1 if tz.startswith("-") else 1
+        tz = tz[1:].replace(":", "")
+        if len(tz) <= 2:
+            offset = int(tz) * 3600
+        else:
+            offset = int(tz[:-2]) * 3600 + int(tz[-2:]) * 60
+        reference -= np.timedelta64(sign * offset, "s")
+    return (CF_TIME_UNITS[unit], reference)
+
+
+def decode_cf_times(values, units, calendar="standard") -> np.ndarray:
+    """Decode numeric CF-times to datetime64[s] using numpy arithmetic.
+
+    Falls back to netCDF4.num2date (cftime) for non-standard calendars,
+    unparsable units and dates before the gregorian calendar. Dates of the
+    noleap and all_leap calendars are kept as they are, e.g. day 365 of a noleap
+    year is 31. December also in leap years.
+
+    :param values: numeric time-values, e.g. from a netcdf variable
+    :param units: CF time-units, e.g. 'seconds since 1970-01-01 00:00:00 +00:00'
+    :param calendar: CF calendar, defaults to 'standard'
+    :return: array of datetime64[s]
+    :raises ValueError: if the times cannot be represented as datetime64, e.g.
+        for the 360_day or julian calendar
+    """
+    values = np.ma.filled(values)
+    parsed = None
+    if calendar.lower() in NUMPY_CALENDARS:
+        parsed = _parse_cf_time_units(units)
+    if parsed is not None:
+        (unit_seconds, reference) = parsed
+        if calendar.lower() != "proleptic_gregorian" and reference < GREGORIAN_START:
+            parsed = None
+    if parsed is None:
+        logger.debug(f"decoding time with cftime: {units}, {calendar}")
+        calendar = calendar.lower()
+        if calendar in NUMPY_CALENDARS + GREGORIAN_DATE_CALENDARS:
+            # the dates of the cftime objects are converted as they are
+            times = np.asarray(
+                netCDF4.num2date(values, units, calendar), dtype="datetime64[s]"
+            )
+            if calendar == "proleptic_gregorian" or not np.any(times < GREGORIAN_START):
+                return times
+        raise ValueError(
+            f"cannot convert times with units '{units}' and calendar "
+            f"'{calendar}' to datetime64"
+        )
+
+    if np.issubdtype(values.dtype, np.integer):
+        offsets = values.astype(np.int64) * unit_seconds
+    else:
+        offsets = np.round(values.astype(np.float64) * unit_seconds).astype(np.int64)
+    return reference + offsets.astype("timedelta64[s]")
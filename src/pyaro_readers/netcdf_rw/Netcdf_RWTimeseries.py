@@ -1,9 +1,12 @@
+import contextlib
 import datetime
+import functools
 import glob
 import inspect
 import json
 import logging
 import os
+import shutil
 import netCDF4
 import numpy as np
 from pyaro.timeseries import (
@@ -13,9 +16,21 @@ from pyaro.timeseries import (
     Station,
 )
 import pyaro.timeseries.Filter
-import xarray as xr
+from pyaro_readers.netcdf_helpers import (
+    decode_cf_times,
+    read_global_attributes,
+    time_envelope,
+    time_index_range,
+)
+from pyaro_readers.parallel_helpers import ordered_map
+from pyaro_readers.netcdf_rw.zarr_backend import ZarrDataset, zarr
 import datetime
 
+try:
+    import fcntl
+except ImportError:
+    # not available on windows, writers are not locked against each other
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +39,141 @@ class Netcdf_RWTimeseriesException(Exception):
     pass
 
 
+def _variable_names(nc) -> list[str]:
+    variable_names = nc.variable_names
+    if isinstance(variable_names, str):
+        variable_names = [variable_names]
+    return list(variable_names)
+
+
+def _history(nc) -> list[str]:
+    history = getattr(nc, "history", [])
+    if isinstance(history, str):
+        history = [history]
+    return list(history)
+
+
+def _first_duplicates(stations, start_times, end_times) -> np.ndarray:
+    """Index of the first record with the same station, start_time and end_time,
+    for each record.
+
+    The stations are encoded as integer codes and the times as seconds, and the
+    records are grouped by a stable sort over these integer keys.
+
+    :return: array of indices, equal to the own index for the first of duplicates
+    """
+    n = len(stations)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    (_, codes) = np.unique(stations, return_inverse=True)
+    starts = np.asarray(start_times, dtype="datetime64[s]").astype(np.int64)
+    ends = np.asarray(end_times, dtype="datetime64[s]").astype(np.int64)
+    order = np.lexsort((ends, starts, codes))
+    new_key = np.ones(n, dtype=bool)
+    new_key[1:] = (
+        (codes[order][1:] != codes[order][:-1])
+        | (starts[order][1:] != starts[order][:-1])
+        | (ends[order][1:] != ends[order][:-1])
+    )
+    group_start = np.maximum.accumulate(np.where(new_key, np.arange(n), 0))
+    first = np.empty(n, dtype=np.int64)
+    first[order] = order[group_start]
+    return first
+
+
+def _unique_records(data, keep="oldest") -> np.ndarray:
+    """sorted index of the records of data without duplicates
+
+    :param data: Data
+    :param keep: 'oldest' keeps the first, 'newest' the last of duplicate records
+    """
+    n = len(data)
+    if keep == "newest":
+        rev = slice(None, None, -1)
+        first = _first_duplicates(
+            data.stations[rev], data.start_times[rev], data.end_times[rev]
+        )
+        return np.sort(n - 1 - np.nonzero(first == np.arange(n))[0])
+    first = _first_duplicates(data.stations, data.start_times, data.end_times)
+    return np.nonzero(first == np.arange(n))[0]
+
+
+def _year_slices(start_times):
+    """split records sorted by start_time into years
+
+    :param start_times: sorted start-times
+    :return: generator of tuples of year and slice of the records starting in that year
+    """
+    years = start_times.astype("datetime64[Y]")
+    if len(years) == 0:
+        return
+    firsts = np.append(0, np.flatnonzero(years[1:] != years[:-1]) + 1)
+    lasts = np.append(firsts[1:], len(years))
+    for first, last in zip(firsts, lasts):
+        yield (int(years[first].astype(int)) + 1970, slice(int(first), int(last)))
+
+
+def _check_keep(keep):
+    if keep not in ("oldest", "newest"):
+        raise Netcdf_RWTimeseriesException(
+            f"keep must be 'oldest' or 'newest', got '{keep}'"
+        )
+
+
+def _nc_stations(nc, pos, rec) -> np.ndarray:
+    """read the station-names of the records rec of the variable at pos
+
+    Stations are stored as integer codes into the station_table, or as strings
+    in files written before the station_table was introduced.
+    """
+    var = nc[f"stations_{pos}"]
+    if np.issubdtype(var.dtype, np.integer):
+        table = np.asarray(nc[var.station_table][:], dtype="U64")
+        return table[np.ma.getdata(var[rec])]
+    return var[rec].astype("U64")
+
+
+def _merge_ranges(firsts, lasts, max_gap):
+    """merge sorted, non-overlapping index-ranges separated by at most max_gap
+
+    :param firsts: first index of the ranges
+    :param lasts: last index (exclusive) of the ranges
+    :param max_gap: number of unwanted records which may be read to join two ranges
+    :return: tuple of list of slices to read, and boolean mask of the wanted
+        records within the concatenated slices
+    """
+    nonempty = lasts > firsts
+    (firsts, lasts) = (firsts[nonempty], lasts[nonempty])
+    if len(firsts) == 0:
+        return ([], np.zeros(0, dtype=bool))
+    split = np.flatnonzero(firsts[1:] - lasts[:-1] > max_gap) + 1
+    span_firsts = firsts[np.append(0, split)]
+    span_lasts = lasts[np.append(split - 1, len(lasts) - 1)]
+    span_offsets = np.cumsum(span_lasts - span_firsts)
+    # position of the ranges within the concatenated spans
+    span = np.searchsorted(span_firsts, firsts, side="right") - 1
+    starts = (
+        firsts
+        - span_firsts[span]
+        + span_offsets[span]
+        - (span_lasts[span] - span_firsts[span])
+    )
+    marks = np.zeros(span_offsets[-1] + 1, dtype=np.int64)
+    np.add.at(marks, starts, 1)
+    np.add.at(marks, starts + lasts - firsts, -1)
+    spans = [slice(int(f), int(l)) for f, l in zip(span_firsts, span_lasts)]
+    return (spans, np.cumsum(marks)[:-1] > 0)
+
+
+def _is_appendable(nc):
+    """files written before netcdf_rw supported appending have fixed dimensions"""
+    return all(
+        dim.isunlimited()
+        for name, dim in nc.dimensions.items()
+        if name.startswith("dim_")
+    )
+
+
 class Netcdf_RWTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
     """Initialize/open a new reader for netcdf-files
 
@@ -33,18 +183,57 @@ class Netcdf_RWTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
     :param filters: list of filters, defaults to []
         files are parsed a per year, so adding a pyaro.timeseries.Filter.TimeBoundsFilter
         is an advantage
+    :param workers: number of processes reading the yearly files in parallel, None or 0
+        meaning one per cpu, defaults to 1
+    :param chunksize: number of records per chunk when writing, defaults to CHUNKSIZE
+    :param compression: compression filter used when writing, 'zlib', or False for no
+        compression, defaults to 'zlib'. 'zstd' and blosc filters like 'blosc_zstd'
+        compress better and faster, but files written with them can only be read
+        where the netcdf-library has the HDF5 filter plugins, e.g. not by
+        h5netcdf/xarray on most hosts. Use them only for data-dirs read on the
+        same host.
+    :param complevel: compression level, defaults to 4
+    :param significant_digits: number of significant digits kept of values and
+        standard_deviations when writing, improving compression, defaults to None,
+        i.e. no quantization
+    :param backend: storage of the yearly data, 'netcdf' for pyaro_netcdf_rw.YYYY.nc
+        files or 'zarr' for pyaro_netcdf_rw.YYYY.zarr directory stores with the same
+        variables, defaults to None, i.e. the backend of an existing data-dir or
+        'netcdf' for a new one
     """
 
     ncfile_prefix = "pyaro_netcdf_rw"
+    # catalog of the data-dir, replacing the json-files of older versions
+    manifest_file = "manifest.json"
+    MANIFEST_VERSION = 1
+    legacy_catalog_files = ["variables.json", "metadata.json", "stations.json"]
+    # lock-file in the data-dir, held by writers during add() and compact()
+    lockfile = ".netcdf_rw.lock"
+    # number of records per chunk of the unlimited record-dimensions
+    CHUNKSIZE = 4096
+    # file-extension of the yearly files of each backend
+    BACKENDS = {"netcdf": "nc", "zarr": "zarr"}
 
     def __init__(
         self,
         filename,
         mode="r",
         filters=[],
+        workers=1,
+        chunksize=CHUNKSIZE,
+        compression="zlib",
+        complevel=4,
+        significant_digits=None,
+        backend=None,
     ):
         self._set_filters(filters)
         self._mode = mode
+        self._workers = workers
+        self._chunksize = chunksize
+        self._compression = compression
+        self._complevel = complevel
+        self._significant_digits = significant_digits
+        self._backend = backend
         if os.path.isdir(filename):
             self._directory = filename
         else:
@@ -55,55 +244,240 @@ class Netcdf_RWTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
             else:
                 os.path.makedirs(filename)
 
-        dataglob = os.path.join(self._directory, f"{self.ncfile_prefix}.????.nc")
-        self._years = set()
-        for file in glob.iglob(dataglob):
-            year = file[-7:-3]
-            if self._is_year_in_filters(year):
-                self._years.add(year)
+        self._read_catalog()
+        return
 
+    def _read_catalog(self):
+        """read the manifest with the years, variables, metadata and stations of
+        the data-dir, without opening any of the yearly files
+        """
         try:
-            self._variables = self._read_json("variables.json", [])
-            self._metadata = self._read_json("metadata.json", {})
-            self._stations = self._read_stations()
+            manifest = self._read_json(self.manifest_file, None)
+            if manifest is None:
+                manifest = self._legacy_manifest()
+            stations = {
+                stat: Station(**stat_kwargs)
+                for stat, stat_kwargs in manifest["stations"].items()
+            }
         except Exception as ex:
             raise Netcdf_RWTimeseriesException(f"unable to read definition-file: {ex}")
-        return
+        if manifest["version"] > self.MANIFEST_VERSION:
+            raise Netcdf_RWTimeseriesException(
+                f"manifest version {manifest['version']} of {self._directory} not supported, max {self.MANIFEST_VERSION}"
+            )
+        self._check_backend(manifest.get("backend"))
+        self._manifest = manifest
+        # files of the committed manifest, still read by readers of this version
+        self._committed_files = self._manifest_files()
+        self._legacy_revision = None
+        self._variables = manifest["variables"]
+        self._metadata = manifest["metadata"]
+        self._stations = stations
+        self._years = set(
+            year for year in manifest["years"] if self._is_year_in_filters(year)
+        )
+
+    def _check_backend(self, backend):
+        """set the backend of the data-dir, or check the requested backend
+
+        :param backend: backend of the manifest, None for a new data-dir
+        """
+        if backend is None:
+            backend = self._backend or "netcdf"
+        if self._backend is not None and self._backend != backend:
+            raise Netcdf_RWTimeseriesException(
+                f"data-dir {self._directory} has backend '{backend}', not '{self._backend}'"
+            )
+        if backend not in self.BACKENDS:
+            raise Netcdf_RWTimeseriesException(
+                f"unknown backend '{backend}', choose from {list(self.BACKENDS)}"
+            )
+        if backend == "zarr" and zarr is None:
+            raise Netcdf_RWTimeseriesException(
+                "backend 'zarr' requires the zarr package, e.g. pyaro_readers[zarr]"
+            )
+        self._backend = backend
+
+    def _open_dataset(self, file, mode="r"):
+        """open a yearly file of the backend of the data-dir
+
+        :param file: filename of the yearly file
+        :param mode: 'r', 'a' or 'w'
+        :return: netCDF4.Dataset or ZarrDataset
+        """
+        if self._backend == "zarr":
+            return ZarrDataset(file, mode)
+        if mode == "w":
+            return netCDF4.Dataset(file, mode, format="NETCDF4")
+        return netCDF4.Dataset(file, mode)
+
+    def _legacy_manifest(self) -> dict:
+        """manifest of data-dirs written before the manifest was introduced, the
+        content of the yearly files is unknown
+        """
+        dataglob = os.path.join(self._directory, f"{self.ncfile_prefix}.????.nc")
+        years = {
+            self._file_year(file): {"variables": None} for file in glob.iglob(dataglob)
+        }
+        return {
+            "version": 0,
+            "generation": 0,
+            "revision": None,
+            "backend": "netcdf" if len(years) > 0 else None,
+            "metadata": self._read_json("metadata.json", {}),
+            "variables": self._read_json("variables.json", []),
+            "stations": self._read_json("stations.json", {}),
+            "years": years,
+        }
+
+    def _scan_year(self, nc) -> dict:
+        """rows and time-range of all variables of an open nc-file, for the manifest"""
+        variables = {}
+        for pos, var_name in enumerate(_variable_names(nc)):
+            if f"dim_{pos}" not in nc.dimensions:
+                continue
+            rows = len(nc.dimensions[f"dim_{pos}"])
+            if rows == 0:
+                continue
+            start_times = nc[f"start_times_{pos}"]
+            end_times = nc[f"end_times_{pos}"]
+            variables[var_name] = {
+                "rows": rows,
+                "start_time": str(
+                    np.min(decode_cf_times(start_times[:], start_times.units))
+                ),
+                "end_time": str(np.max(decode_cf_times(end_times[:], end_times.units))),
+            }
+        return variables
+
+    def _update_manifest_year(self, year, nc, data, rows):
+        """update rows and time-range of a variable of a year in the manifest
+
+        :param year: year of the file
+        :param nc: nc-file, with data already written
+        :param data: data written to the nc-file
+        :param rows: number of valid records of the variable in the nc-file
+        """
+        entry = self._manifest["years"].setdefault(str(year), {"variables": {}})
+        if entry["variables"] is None:
+            entry["variables"] = self._scan_year(nc)
+        start = np.min(data.start_times)
+        end = np.max(data.end_times)
+        stats = entry["variables"].get(data.variable)
+        if stats is not None:
+            start = min(start, np.datetime64(stats["start_time"]))
+            end = max(end, np.datetime64(stats["end_time"]))
+        entry["variables"][data.variable] = {
+            "rows": rows,
+            "start_time": str(start),
+            "end_time": str(end),
+        }
+
+    def _commit_manifest(self):
+        """write the manifest atomically, making the written records visible to
+        new readers
+        """
+        for year, entry in self._manifest["years"].items():
+            if entry["variables"] is None:
+                # years of data-dirs written before the manifest was introduced
+                with self._open_dataset(self._ncfilename(year)) as nc:
+                    entry["variables"] = self._scan_year(nc)
+        stations = {}
+        for stat, station in self._stations.items():
+            if pyaro.__version__ > "0.0.10":
+                stations[stat] = station.init_kwargs()
+            else:
+                stations[stat] = {
+                    "fields": station._fields,
+                    "metadata": station.metadata,
+                }
+        metadata = dict(self._metadata)
+        metadata.pop("revision", None)
+        self._manifest.update(
+            {
+                "version": self.MANIFEST_VERSION,
+                "generation": self._manifest["generation"] + 1,
+                "revision": f"{datetime.datetime.now():%y%m%d%H%M%S}",
+                "backend": self._backend,
+                "metadata": metadata,
+                "variables": self._variables,
+                "stations": stations,
+            }
+        )
+        self._write_json(self._manifest, self.manifest_file)
+        self._remove_unused_files()
+        for file in self.legacy_catalog_files:
+            filepath = os.path.join(self._directory, file)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """exclusive lock of the data-dir, waiting for other writers
+
+        The catalog is re-read after acquiring the lock, since other writers
+        might have changed the data-dir since it was opened.
+        """
+        if self._mode == "r":
+            raise Netcdf_RWTimeseriesException(
+                f"writing not allowed on readonly (mode='{self._mode}') data-dir"
+            )
+        with open(os.path.join(self._directory, self.lockfile), "a") as fh:
+            if fcntl is not None:
+                logger.debug(f"waiting for lock on {self._directory}")
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._read_catalog()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
 
     def iterate_files(self):
-        for y in self._years:
-            file_path = os.path.join(self._directory, f"{self.ncfile_prefix}.{y}.nc")
+        for y in sorted(self._years):
+            file_path = self._ncfilename(y)
             if os.path.exists(file_path):
                 yield file_path
 
     def metadata(self):
-        metadata = dict()
+        metadata = dict(self._metadata)
+        revision = self._manifest["revision"]
+        if revision is None:
+            # data-dirs written before the manifest was introduced
+            if self._legacy_revision is None:
+                self._legacy_revision = (
+                    metadata.get("revision") or self._revision_from_files()
+                )
+            revision = self._legacy_revision
+        metadata["revision"] = revision
+        return metadata
+
+    def _revision_from_files(self):
         date = datetime.datetime.min
-        for f in self.iterate_files():
-            with xr.open_dataset(f) as d:
-                hist = d.attrs.get("last_changed", None)
+        # only the global attributes are read, in parallel
+        for attrs in read_global_attributes(
+            list(self.iterate_files()), ["last_changed", "history"], self._workers
+        ):
+            hist = attrs.get("last_changed", None)
 
+            try:
+                datestr = hist.split("//")[0]
+                new_date = datetime.datetime.strptime(datestr, "%a %b %d %H:%M:%S %Y")
+            except Exception:
                 try:
-                    datestr = hist.split("//")[0]
-                    new_date = datetime.datetime.strptime(
-                        datestr, "%a %b %d %H:%M:%S %Y"
-                    )
+                    hist = attrs.get("history", "")
+                    if isinstance(hist, str):
+                        hist = [hist]
+                    hist = list(hist)[-1]
+                    datestr = " ".join(hist.split(" ")[:2])
+                    new_date = datetime.datetime.strptime(datestr, "%Y-%m-%d %H:%M:%S")
                 except Exception:
-                    try:
-                        hist = d.attrs.get("history", "")[-1]
-                        datestr = " ".join(hist.split(" ")[:2])
-                        new_date = datetime.datetime.strptime(
-                            datestr, "%Y-%m-%d %H:%M:%S"
-                        )
-                    except Exception:
-                        new_date = datetime.datetime.min
+                    new_date = datetime.datetime.min
 
-                if new_date > date:
-                    date = new_date
+            if new_date > date:
+                date = new_date
 
-        metadata["revision"] = datetime.datetime.strftime(date, "%y%m%d%H%M%S")
-
-        return metadata
+        return datetime.datetime.strftime(date, "%y%m%d%H%M%S")
 
     def _read_json(self, file, empty):
         filepath = os.path.join(self._directory, file)
@@ -114,237 +488,749 @@ class Netcdf_RWTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
         return res
 
     def _write_json(self, obj, file):
+        # replace the file atomically, readers see either the old or the new file
         filepath = os.path.join(self._directory, file)
-        with open(filepath, "w") as fh:
+        tmpfile = f"{filepath}.{os.getpid()}"
+        with open(tmpfile, "w") as fh:
             json.dump(obj, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmpfile, filepath)
         return
 
-    def _read_stations(self) -> dict[str, Station]:
-        stat_dict = {}
-        for stat, stat_kwargs in self._read_json("stations.json", {}).items():
-            stat_dict[stat] = Station(**stat_kwargs)
-        return stat_dict
+    def _year_time_range(self, year, varname=None):
+        """earliest start_time and latest end_time of a year from the manifest,
+        or the calendar year if the content of the year is unknown
 
-    def _write_stations(self):
-        stat_obj = {}
-        for stat, station in self.stations().items():
-            if pyaro.__version__ > "0.0.10":
-                stat_obj[stat] = station.init_kwargs()
-            else:
-                stat_obj[stat] = {
-                    "fields": station._fields,
-                    "metadata": station.metadata,
-                }
-        self._write_json(stat_obj, "stations.json")
-
-    def _is_year_in_filters(self, year):
-        start_year = np.datetime64(f"{year}-01-01 00:00:00")
-        end_year = np.datetime64(f"{year}-12-31 23:59:59")
-        time_filter = pyaro.timeseries.Filter.TimeBoundsFilter()
-        for fil in self._get_filters():
-            if isinstance(fil, pyaro.timeseries.Filter.TimeBoundsFilter):
-                time_filter = fil
-        if time_filter.has_envelope():
-            start, end = time_filter.envelope()
+        :param year: year of the file
+        :param varname: restrict to this variable, defaults to None, i.e. all
+        :return: tuple of datetime64, or None if there is no such data in the year
+        """
+        variables = self._manifest["years"].get(str(year), {}).get("variables")
+        if variables is None:
+            return (
+                np.datetime64(f"{year}-01-01 00:00:00"),
+                np.datetime64(f"{year}-12-31 23:59:59"),
+            )
+        if varname is not None:
+            variables = {k: v for k, v in variables.items() if k == varname}
+        if len(variables) == 0:
+            return None
+        return (
+            min(np.datetime64(v["start_time"]) for v in variables.values()),
+            max(np.datetime64(v["end_time"]) for v in variables.values()),
+        )
+
+    def _is_year_in_filters(self, year, varname=None):
+        time_range = self._year_time_range(year, varname)
+        if time_range is None:
+            return False
+        (start_year, end_year) = time_range
+        envelope = time_envelope(self._get_filters())
+        if envelope is not None:
+            start, end = envelope
             if end_year < start:
                 return False
             if end < start_year:
                 return False
         return True
 
-    def _get_data_from_ncfile(
-        self, varname, file, data: NpStructuredData
-    ) -> NpStructuredData:
-        with netCDF4.Dataset(file, "r") as nc:
-            pos = nc.variable_names.index(varname)
-            if pos < 0:
+    def _committed_rows(self, year, varname):
+        """number of records of varname in year committed to the manifest, or
+        None if unknown, i.e. for years written before the manifest
+        """
+        variables = self._manifest["years"].get(str(year), {}).get("variables")
+        if variables is None:
+            return None
+        return variables.get(varname, {}).get("rows", 0)
+
+    def _ncfilename(self, year):
+        """yearly file of a year, the version named by the manifest, or the
+        unversioned file of years written before versioning
+        """
+        name = self._manifest["years"].get(str(year), {}).get("file")
+        if name is not None:
+            return os.path.join(self._directory, name)
+        extension = self.BACKENDS[self._backend]
+        return os.path.join(self._directory, f"{self.ncfile_prefix}.{year}.{extension}")
+
+    def _file_year(self, file) -> str:
+        """year of a yearly file, i.e. YYYY of pyaro_netcdf_rw.YYYY.nc"""
+        return os.path.basename(file)[len(self.ncfile_prefix) + 1 :][:4]
+
+    def _station_selection(self) -> set[str] | None:
+        """stations passing the station-filters
+
+        :return: set of station-names, or None if all stations pass
+        """
+        stations = self.stations()
+        if len(stations) == len(self._stations):
+            return None
+        return set(stations.keys())
+
+    def _get_data_from_ncfile(self, varname, file) -> tuple[str, list] | None:
+        """read all data of varname from one yearly file
+
+        :return: tuple of units and list of data-columns in the order of
+            NpStructuredData.append, or None if varname is not in file
+        """
+        with self._open_dataset(file) as nc:
+            variable_names = _variable_names(nc)
+            if varname not in variable_names:
                 logger.info(f"{varname} not in file {file}")
-                return data
+                return None
+            pos = variable_names.index(varname)
             if f"start_times_{pos}" not in nc.variables:
                 logger.info(f"{varname} not in file {file}, pos {pos}")
-                return data
+                return None
+            # records written after the last commit of the manifest are ignored
+            rows = self._committed_rows(self._file_year(file), varname)
+            return self._read_ncvariable(
+                nc,
+                pos,
+                time_envelope(self._get_filters()),
+                self._station_selection(),
+                rows,
+            )
+
+    def _read_ncvariable(
+        self, nc, pos, envelope=None, stations=None, rows=None
+    ) -> tuple[str, list] | None:
+        """read the records of the variable at pos of an open nc-file
 
-            start_times = netCDF4.num2date(
-                nc[f"start_times_{pos}"][:], nc[f"start_times_{pos}"].units
+        :param nc: open nc-file
+        :param pos: position of the variable in the variable_names attribute
+        :param envelope: tuple of start and end to read only a time-slice,
+            defaults to None, i.e. all records
+        :param stations: set of station-names to read, defaults to None, i.e. all
+        :param rows: read only the first rows records, defaults to None, i.e. all
+        :return: tuple of units and list of data-columns in the order of
+            NpStructuredData.append, or None if no records are in the envelope
+        """
+        total = len(nc.dimensions[f"dim_{pos}"])
+        if rows is not None:
+            total = min(rows, total)
+        if f"index_offsets_{pos}" in nc.variables:
+            (firsts, lasts) = self._index_ranges(nc, pos, envelope, stations)
+            (firsts, lasts) = (np.minimum(firsts, total), np.minimum(lasts, total))
+        else:
+            # files without index, sorted by start_time if written before
+            # appending was possible
+            start_times = decode_cf_times(
+                nc[f"start_times_{pos}"][:total], nc[f"start_times_{pos}"].units
             )
-            end_times = netCDF4.num2date(
-                nc[f"end_times_{pos}"][:], nc[f"end_times_{pos}"].units
+            end_times = decode_cf_times(
+                nc[f"end_times_{pos}"][:total], nc[f"end_times_{pos}"].units
             )
-            data_name = f"values_{pos}"
-            data_is_new = len(data) == 0 and data.units == ""
-            if data_is_new:
-                data = NpStructuredData(varname, nc[data_name].units)
-            if data.units != "" and nc[data_name].units != data.units:
-                logger.warning(
-                    f"units-change for {varname}/{data_name} in {file}: {nc[data_name].units} != {data.units}"
-                )
+            if len(start_times) > 1 and np.any(start_times[1:] < start_times[:-1]):
+                envelope = None
+            rec = time_index_range(start_times, end_times, envelope)
+            (firsts, lasts) = (np.array([rec.start]), np.array([rec.stop]))
+        chunking = nc[f"values_{pos}"].chunking()
+        if chunking is None or chunking == "contiguous":
+            # files written before chunking was set
+            max_gap = self._chunksize
+        else:
+            max_gap = chunking[0]
+        (spans, wanted) = _merge_ranges(firsts, lasts, max_gap)
+        if len(spans) == 0:
+            return None
+
+        def read(name, fill_value=None):
+            var = nc[f"{name}_{pos}"]
+            if len(spans) == 1:
+                values = var[spans[0]]
+            else:
+                values = np.ma.concatenate([var[span] for span in spans])
+            if fill_value is not None:
+                values = np.ma.filled(values, fill_value)
+            return values[wanted]
 
-            data.append(
-                nc[data_name][:].filled(np.nan),
-                nc[f"stations_{pos}"][:].astype("U64"),
-                nc[f"latitudes_{pos}"][:].filled(np.nan),
-                nc[f"longitudes_{pos}"][:].filled(np.nan),
-                nc[f"altitudes_{pos}"][:].filled(np.nan),
-                start_times,
-                end_times,
-                nc[f"flags_{pos}"][:].filled(-32767),
-                nc[f"standard_deviations_{pos}"][:].filled(np.nan),
+        data_name = f"values_{pos}"
+        start_times = nc[f"start_times_{pos}"]
+        end_times = nc[f"end_times_{pos}"]
+        return (
+            nc[data_name].units,
+            [
+                read("values", np.nan),
+                np.concatenate([_nc_stations(nc, pos, span) for span in spans])[wanted],
+                read("latitudes", np.nan),
+                read("longitudes", np.nan),
+                read("altitudes", np.nan),
+                decode_cf_times(read("start_times"), start_times.units),
+                decode_cf_times(read("end_times"), end_times.units),
+                read("flags", -32767),
+                read("standard_deviations", np.nan),
+            ],
+        )
+
+    def _index_ranges(self, nc, pos, envelope=None, stations=None):
+        """record-ranges of the stations and the time-envelope from the index
+        of the variable at pos
+
+        The records of the index are sorted by station and start_time, records
+        appended afterwards are always read completely.
+
+        :return: tuple of arrays of first and last (exclusive) record of the ranges
+        """
+        offsets = nc[f"index_offsets_{pos}"]
+        index = np.ma.getdata(offsets[:])
+        if stations is not None:
+            table = np.asarray(nc["station_table"][:], dtype="U64")
+            names = table[np.ma.getdata(nc[f"index_stations_{pos}"][:])]
+            index = index[np.isin(names, list(stations))]
+        (first_bin, last_bin) = (0, index.shape[1] - 1)
+        if envelope is not None:
+            time_bins = decode_cf_times(
+                nc["index_time_bins"][:], nc["index_time_bins"].units
             )
-        return data
+            (start, end) = (np.datetime64(t, "s") for t in envelope)
+            # records starting up to max_duration before the envelope might end in it
+            start -= np.timedelta64(int(offsets.max_duration), "s")
+            first_bin = np.searchsorted(time_bins, start, side="right") - 1
+            first_bin = min(max(first_bin, 0), index.shape[1] - 1)
+            last_bin = np.searchsorted(time_bins, end, side="right")
+            last_bin = min(max(last_bin, first_bin), index.shape[1] - 1)
+        firsts = index[:, first_bin]
+        lasts = index[:, last_bin]
+        # the unsorted, appended records
+        indexed = int(offsets.indexed_records)
+        total = len(nc.dimensions[f"dim_{pos}"])
+        return (np.append(firsts, indexed), np.append(lasts, total))
+
+    def _next_ncfilename(self, year):
+        """filename of the next version of the yearly file of a year, e.g.
+        pyaro_netcdf_rw.YYYY.v1.nc
 
-    def _tmp_and_real_ncfilename(self, year):
-        tmpfile = os.path.join(
-            self._directory, f"{self.ncfile_prefix}.{year}.nc.{os.getpid()}"
+        Committed yearly files are never changed, writers copy or rewrite them
+        to the next version, which the manifest switches to.
+        """
+        version = self._manifest["years"].get(str(year), {}).get("version", 0) + 1
+        extension = self.BACKENDS[self._backend]
+        return os.path.join(
+            self._directory, f"{self.ncfile_prefix}.{year}.v{version}.{extension}"
         )
-        file = os.path.join(self._directory, f"{self.ncfile_prefix}.{year}.nc")
-        return (tmpfile, file)
-
-    def _tmp_ncfile(self, year, readerstr):
-        tmpfile, file = self._tmp_and_real_ncfilename(year)
-        tmpnc = netCDF4.Dataset(tmpfile, "w", format="NETCDF4")
-        if os.path.exists(file):
-            with netCDF4.Dataset(file, "r") as nc:
-                vars = nc.variable_names
-                for var in self.variables():
-                    if not var in vars:
-                        vars.append(var)
-                tmpnc.variable_names = vars
-                oldhistory = nc.history
-                if isinstance(oldhistory, str):
-                    oldhistory = [oldhistory]
-                tmpnc.history = oldhistory + [
-                    f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} updated with netcdf_rw from {readerstr}"
-                ]
 
+    def _replace_ncfile(self, year, file):
+        """switch the yearly file of a year to a new version
+
+        The new version becomes visible to readers when the manifest is
+        committed, the old version is removed by the commit after that.
+        """
+        entry = self._manifest["years"].setdefault(str(year), {"variables": {}})
+        entry["file"] = os.path.basename(file)
+        entry["version"] = int(entry["file"].split(".")[-2][1:])
+
+    def _copy_ncfile(self, file, newfile):
+        """copy a yearly file or directory store, replacing leftovers at newfile"""
+        self._remove_ncfile(newfile)
+        if self._backend == "netcdf":
+            shutil.copyfile(file, newfile)
         else:
-            tmpnc.variable_names = self.variables()
-            tmpnc.history = [
-                f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} creation with netcdf_rw from {readerstr}"
-            ]
-        return tmpnc
+            shutil.copytree(file, newfile)
 
-    def _update_ncfile(self, nc, year, data):
-        """write the data to a nc-file, creating if needed
+    def _remove_ncfile(self, file):
+        """remove a yearly file or directory store, if it exists"""
+        if os.path.isdir(file):
+            shutil.rmtree(file)
+        elif os.path.exists(file):
+            os.remove(file)
 
-        :param nc: writeable nc-file, with variable_names global attribute
-        :param year: year of data
-        :param data: filtered data for one year
+    def _manifest_files(self) -> set[str]:
+        """yearly files referenced by the manifest"""
+        return set(self._ncfilename(year) for year in self._manifest["years"])
+
+    def _remove_unused_files(self):
+        """remove the yearly files neither referenced by the manifest nor by the
+        previously committed manifest, i.e. older versions of rewritten years and
+        leftovers of interrupted writers
+
+        Versions of the previous manifest are kept for readers which opened the
+        data-dir before the commit.
         """
-        var_name = data.variable
-        units = data.units
-        pos = nc.variable_names.index(var_name)
-        if pos < 0:
+        used = self._manifest_files()
+        extension = self.BACKENDS[self._backend]
+        dataglob = os.path.join(
+            self._directory, f"{self.ncfile_prefix}.????*.{extension}"
+        )
+        for file in glob.iglob(dataglob):
+            if file not in used and file not in self._committed_files:
+                logger.debug(f"removing unused {file}")
+                self._remove_ncfile(file)
+        self._committed_files = used
+
+    def _history_entry(self, action, readerstr):
+        return f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} {action} with netcdf_rw from {readerstr}"
+
+    def _open_ncfile(self, year, readerstr, keep="oldest"):
+        """open the next version of the nc-file of a year for appending, creating
+        it if needed
+
+        The committed file is copied to the next version, so readers never see
+        partially written data. Files written with fixed dimensions are
+        compacted instead, i.e. rewritten with unlimited dimensions.
+
+        :param year: year of the file
+        :param readerstr: description of the source of the data, for the history
+        :param keep: duplicates to keep when compacting, 'oldest' or 'newest'
+        :return: writeable nc-file, with variable_names global attribute
+        """
+        file = self._ncfilename(year)
+        newfile = self._next_ncfilename(year)
+        if str(year) in self._manifest["years"] and os.path.exists(file):
+            with self._open_dataset(file) as nc:
+                appendable = _is_appendable(nc)
+            if appendable:
+                self._copy_ncfile(file, newfile)
+                self._replace_ncfile(year, newfile)
+            else:
+                self._compact_year(year, keep)
+            nc = self._open_dataset(self._ncfilename(year), "a")
+            nc.history = _history(nc) + [self._history_entry("updated", readerstr)]
+        else:
+            nc = self._open_dataset(newfile, "w")
+            self._replace_ncfile(year, newfile)
+            nc.variable_names = self.variables()
+            nc.history = [self._history_entry("creation", readerstr)]
+        return nc
+
+    def _compact_year(self, year, keep="oldest"):
+        """rewrite the nc-file of a year with duplicates removed, sorted by
+        station and start_time, indexed and with unlimited dimensions
+
+        :param year: year of the file
+        :param keep: 'oldest' keeps the first written, 'newest' the last written
+            of duplicate records, defaults to 'oldest'
+        """
+        file = self._ncfilename(year)
+        newfile = self._next_ncfilename(year)
+        logger.info(f"compacting {file}")
+        with self._open_dataset(file) as nc, self._open_dataset(newfile, "w") as tmpnc:
+            variable_names = _variable_names(nc)
+            tmpnc.variable_names = variable_names
+            tmpnc.history = _history(nc) + [self._history_entry("compaction", file)]
+            for pos, var_name in enumerate(variable_names):
+                if f"start_times_{pos}" not in nc.variables:
+                    continue
+                result = self._read_ncvariable(
+                    nc, pos, rows=self._committed_rows(year, var_name)
+                )
+                if result is None:
+                    continue
+                (units, columns) = result
+                data = NpStructuredData(var_name, units)
+                data.append(*columns)
+                data = data.slice(_unique_records(data, keep))
+                self._write_ncvariable(tmpnc, pos, year, data)
+            entry = self._manifest["years"][str(year)]
+            entry["variables"] = self._scan_year(tmpnc)
+        self._replace_ncfile(year, newfile)
+
+    def compact(self, keep="oldest"):
+        """rewrite all yearly files of the database with duplicates removed and
+        records sorted and indexed by station and start_time
+
+        Records appended by add() to existing variables are not indexed and are
+        read completely by every query until the year is compacted.
+
+        :param keep: 'oldest' keeps the first written, 'newest' the last written
+            of duplicate records, defaults to 'oldest'
+        """
+        _check_keep(keep)
+        with self._locked():
+            for year in sorted(self._years):
+                if os.path.exists(self._ncfilename(year)):
+                    self._compact_year(year, keep)
+            self._commit_manifest()
+
+    def _write_ncvariable(self, nc, pos, year, data):
+        """write a new variable sorted by station and start_time, and its index
+
+        The index contains for each station the offsets of the first record of
+        each month, and the offset after the last record. Records appended
+        later are not part of the index.
+
+        :param nc: writeable nc-file
+        :param pos: position of the variable in the variable_names attribute
+        :param year: year of the file
+        :param data: data of the variable for the year, without duplicates
+        """
+        data = data.slice(np.lexsort((data.start_times, data.stations)))
+        self._create_ncvariable(nc, pos, data)
+        self._append_ncvariable(nc, pos, data, 0)
+
+        if "index_time_bins" not in nc.variables:
+            nc.createDimension("index_time_bins", 13)
+            var = nc.createVariable("index_time_bins", np.int64, ("index_time_bins"))
+            var.units = "seconds since 1970-01-01 00:00:00 +00:00"
+            var[:] = (
+                np.arange(f"{year}-01", f"{int(year) + 1}-02", dtype="datetime64[M]")
+                .astype("datetime64[s]")
+                .astype(np.int64)
+            )
+        time_bins = decode_cf_times(
+            nc["index_time_bins"][:], nc["index_time_bins"].units
+        )
+        (_, station_firsts, station_idx) = np.unique(
+            data.stations, return_index=True, return_inverse=True
+        )
+        bins = np.searchsorted(time_bins, data.start_times, side="right") - 1
+        bins = np.clip(bins, 0, len(time_bins) - 2)
+        # records are sorted by (station, bin), so are their combined keys
+        keys = station_idx.astype(np.int64) * len(time_bins) + bins
+        wanted = np.arange(len(station_firsts) * len(time_bins))
+        offsets = np.searchsorted(keys, wanted, side="left")
+        offsets = offsets.reshape((len(station_firsts), len(time_bins)))
+
+        dim_name = f"index_{pos}"
+        nc.createDimension(dim_name, len(station_firsts))
+        var = nc.createVariable(f"index_stations_{pos}", np.int32, (dim_name))
+        var.station_table = "station_table"
+        var[:] = self._station_codes(nc, data.stations[station_firsts])
+        var = nc.createVariable(
+            f"index_offsets_{pos}", np.int64, (dim_name, "index_time_bins")
+        )
+        var.indexed_records = len(data)
+        var.max_duration = int(
+            np.max(data.end_times - data.start_times)
+            .astype("timedelta64[s]")
+            .astype(int)
+        )
+        var[:] = offsets
+
+    def _compression_kwargs(self, nc) -> dict:
+        """compression arguments of createVariable for the layout of this reader"""
+        compression = self._compression
+        if not compression:
+            return {"compression": None}
+        if compression.startswith("blosc") and not nc.has_blosc_filter():
             raise Netcdf_RWTimeseriesException(
-                f"{var_name} not in {nc.variable_names} for {year}"
+                f"compression {compression} requires the HDF5 blosc filter plugin"
             )
+        if compression == "zstd" and not nc.has_zstd_filter():
+            raise Netcdf_RWTimeseriesException(
+                f"compression {compression} requires the HDF5 zstd filter plugin"
+            )
+        return {
+            "compression": compression,
+            "complevel": self._complevel,
+            "shuffle": True,
+        }
+
+    def _station_codes(self, nc, stations) -> np.ndarray:
+        """integer codes of the stations in the station_table of a nc-file,
+        adding missing stations to the table
+
+        :param nc: writeable nc-file
+        :param stations: array of station-names
+        :return: array of int32 codes
+        """
+        if "station_table" not in nc.variables:
+            nc.createDimension("station_table", None)
+            nc.createVariable("station_table", str, ("station_table",))
+        table = nc["station_table"]
+        names = list(table[:]) if len(table) > 0 else []
+        codes = {name: code for code, name in enumerate(names)}
+        (unique_stations, inverse) = np.unique(stations, return_inverse=True)
+        new_stations = [stat for stat in unique_stations if stat not in codes]
+        if len(new_stations) > 0:
+            table[len(names) : len(names) + len(new_stations)] = np.array(
+                new_stations, dtype=object
+            )
+            for stat in new_stations:
+                codes[stat] = len(codes)
+        unique_codes = np.array([codes[stat] for stat in unique_stations], np.int32)
+        return unique_codes[inverse]
+
+    def _create_ncvariable(self, nc, pos, data):
+        """create the record-dimension and the variables of data in a nc-file
+
+        :param nc: writeable nc-file
+        :param pos: position of the variable in the variable_names attribute
+        :param data: data of the variable, defining dtypes and units
+        """
+        var_name = data.variable
         dim_name = f"dim_{pos}"
-        nc.createDimension(dim_name, len(data))
+        nc.createDimension(dim_name, None)
+        compression = self._compression_kwargs(nc)
         for x in data.keys():
             if "time" in x:
-                var = nc.createVariable(
-                    f"{x}_{pos}", np.int64, (dim_name), compression="zlib"
-                )
+                dtype = np.int64
+            elif x == "stations":
+                dtype = np.int32
+            else:
+                dtype = data[x].dtype
+            quantization = {}
+            if self._significant_digits is not None and x in (
+                "values",
+                "standard_deviations",
+            ):
+                quantization = {"significant_digits": self._significant_digits}
+            var = nc.createVariable(
+                f"{x}_{pos}",
+                dtype,
+                (dim_name),
+                chunksizes=(self._chunksize,),
+                **compression,
+                **quantization,
+            )
+            if "time" in x:
                 var.units = "seconds since 1970-01-01 00:00:00 +00:00"
-                var[:] = data[x].astype("datetime64[s]").astype("int64")
+            if x == "stations":
+                var.station_table = "station_table"
+            if x == "altitudes":
+                var.units = "m"
+                var.standard_name = "altitude"
+                var.positive = "up"
+            if x == "longitudes":
+                var.units = "degrees_east"
+            if x == "latitudes":
+                var.units = "degrees_north"
+            if x == "values":
+                var.units = data.units
+                var.long_name = var_name
+                var.coordinates = f"longitudes_{pos} latitudes_{pos} altitudes_{pos}"
+
+    def _append_ncvariable(self, nc, pos, data, rec):
+        """write data to the record-dimension of a variable
+
+        :param nc: writeable nc-file
+        :param pos: position of the variable in the variable_names attribute
+        :param data: data of the variable
+        :param rec: record to write the first record of data to, or sorted
+            record-index to overwrite
+        """
+        if np.isscalar(rec):
+            rec = slice(rec, rec + len(data))
+        for x in data.keys():
+            var = nc[f"{x}_{pos}"]
+            if "time" in x:
+                var[rec] = data[x].astype("datetime64[s]").astype("int64")
+            elif x == "stations" and np.issubdtype(var.dtype, np.integer):
+                var[rec] = self._station_codes(nc, data[x])
             else:
-                compression = "zlib"
-                if x == "stations":
-                    compression = False
-                var = nc.createVariable(
-                    f"{x}_{pos}", data[x].dtype, (dim_name), compression=compression
-                )
-                if x == "altitudes":
-                    var.units = "m"
-                    var.standard_name = "altitude"
-                    var.positive = "up"
-                if x == "longitudes":
-                    var.units = "degrees_east"
-                if x == "latitudes":
-                    var.units = "degrees_north"
-                if x == "values":
-                    var.units = units
-                    var.long_name = var_name
-                    var.coordinates = (
-                        f"longitudes_{pos} latitudes_{pos} altitudes_{pos}"
-                    )
-                var[:] = data[x]
-
-    def add(self, reader: pyaro.timeseries.Reader):
+                var[rec] = data[x]
+
+    def _match_records(self, nc, pos, data, rows):
+        """match the records of data with the records in the nc-file
+
+        Only existing records within the time-window of data are compared.
+
+        :param nc: open nc-file
+        :param pos: position of the variable in the variable_names attribute
+        :param data: data without internal duplicates
+        :param rows: number of committed records of the variable in the nc-file
+        :return: tuple of the index of the new records in data, the index of the
+            existing duplicates in data and their record-index in the nc-file
+        """
+        start_times = decode_cf_times(
+            nc[f"start_times_{pos}"][:rows], nc[f"start_times_{pos}"].units
+        )
+        window = np.nonzero(
+            (start_times >= np.min(data.start_times))
+            & (start_times <= np.max(data.start_times))
+        )[0]
+        if len(window) == 0:
+            return (np.arange(len(data)), np.zeros(0, dtype=int), window)
+        # the window is scattered over the stations of sorted files, reading its
+        # bounding slice is much faster than netcdf array-indexing
+        bounds = slice(window[0], window[-1] + 1)
+        in_bounds = window - window[0]
+        end_times = decode_cf_times(
+            nc[f"end_times_{pos}"][bounds], nc[f"end_times_{pos}"].units
+        )[in_bounds]
+        # existing records come first, so they are the first of duplicates
+        first = _first_duplicates(
+            np.concatenate([_nc_stations(nc, pos, bounds)[in_bounds], data.stations]),
+            np.concatenate([start_times[window], data.start_times]),
+            np.concatenate([end_times, data.end_times]),
+        )[len(window) :]
+        existing = first < len(window)
+        return (
+            np.nonzero(~existing)[0],
+            np.nonzero(existing)[0],
+            window[first[existing]],
+        )
+
+    def _update_ncfile(self, nc, year, data, keep="oldest"):
+        """append the new records of data to a nc-file, creating the variable
+        if needed
+
+        :param nc: writeable nc-file, with variable_names global attribute
+        :param year: year of data
+        :param data: filtered data for one year, without internal duplicates
+        :param keep: 'oldest' keeps the existing, 'newest' overwrites the existing
+            duplicate records, defaults to 'oldest'
+        """
+        var_name = data.variable
+        variable_names = _variable_names(nc)
+        if var_name not in variable_names:
+            variable_names.append(var_name)
+            nc.variable_names = variable_names
+        pos = variable_names.index(var_name)
+        if f"dim_{pos}" not in nc.dimensions:
+            logger.debug(f"writing {len(data)} records of {var_name} to {year}")
+            self._write_ncvariable(nc, pos, year, data)
+            self._update_manifest_year(year, nc, data, len(data))
+            return
+        units = nc[f"values_{pos}"].units
+        if units != data.units:
+            raise Netcdf_RWTimeseriesException(
+                f"change of unit for variable {var_name} from {units} to {data.units} in {year}"
+            )
+        # records after the committed ones are leftovers of interrupted writers,
+        # they are overwritten
+        committed = self._committed_rows(year, var_name)
+        if committed is None:
+            committed = len(nc.dimensions[f"dim_{pos}"])
+        (new, duplicates, rec) = self._match_records(nc, pos, data, committed)
+        if keep == "newest" and len(duplicates) > 0:
+            logger.debug(f"replacing {len(rec)} records of {var_name} in {year}")
+            order = np.argsort(rec)
+            self._append_ncvariable(nc, pos, data.slice(duplicates[order]), rec[order])
+        logger.debug(f"appending {len(new)} records of {var_name} to {year}")
+        self._append_ncvariable(nc, pos, data.slice(new), committed)
+        self._update_manifest_year(year, nc, data, committed + len(new))
+
+    def add(self, reader: pyaro.timeseries.Reader, append=True, keep="oldest"):
         """add content of another reader to this netcdf_rw database
 
         All content will be added, except for duplicates which will be removed.
+        Records are duplicates if they share station, start_time and end_time.
+        Only the new records are appended to the yearly files, duplicates are
+        searched within the time-window of the new data. Use compact() to sort
+        and index the appended records. Writers to the same data-dir wait for
+        each other.
 
         :param reader: another pyaro-Reader including filters
+        :param append: append to the yearly files, defaults to True. If False, the
+            affected yearly files are compacted after adding, i.e. all their
+            records are sorted and indexed.
+        :param keep: 'oldest' keeps the existing records, 'newest' replaces them by
+            the records of the reader, defaults to 'oldest'
         """
-        if self._mode == "r":
-            raise Netcdf_RWTimeseriesException(
-                f"add() not allowed on readonly (mode='{self._mode}') data-dir"
+        _check_keep(keep)
+        with self._locked():
+            self._add(reader, append, keep)
+        return
+
+    def add_stream(self, readers, append=True, keep="oldest"):
+        """add the content of a sequence of readers, each being a chunk of the source
+
+        Each chunk is written and committed before the next reader is taken
+        from the sequence, and each reader is closed after its content is
+        written. Memory stays bounded by the largest variable of a chunk, when
+        the readers are opened lazily, e.g. by a generator with one reader per
+        year or per group of stations::
+
+            rw.add_stream(
+                pyaro.open_timeseries(
+                    "eeareader",
+                    path,
+                    filters={"time_bounds": {"startend_include": [
+                        (f"{year}-01-01 00:00:00", f"{year}-12-31 23:59:59")
+                    ]}},
+                )
+                for year in range(1990, 2024)
             )
+
+        :param readers: iterable of pyaro-Readers including filters
+        :param append: append to the yearly files, defaults to True. If False, the
+            yearly files affected by any chunk are compacted after adding the last
+            chunk, i.e. all their records are sorted and indexed.
+        :param keep: 'oldest' keeps the existing records, 'newest' replaces them by
+            the records of the readers, defaults to 'oldest'
+        """
+        _check_keep(keep)
+        with self._locked():
+            years = set()
+            for reader in readers:
+                logger.info(f"adding chunk {reader}")
+                try:
+                    years |= self._add(reader, True, keep)
+                finally:
+                    reader.close()
+            if not append and years:
+                self._compact_years(years, keep)
+        return
+
+    def _compact_years(self, years, keep):
+        """compact the yearly files of years and commit the manifest"""
+        for year in sorted(years):
+            self._compact_year(year, keep)
+        self._commit_manifest()
+
+    def _add(self, reader, append, keep) -> set:
+        """add() while holding the lock of the data-dir
+
+        :return: the years written to
+        """
         self._metadata = reader.metadata() | self._metadata
         self._stations = reader.stations() | self._stations
-        org_variables = self._variables
-        self._variables = list(set(org_variables + reader.variables()))
+        self._variables = list(set(self._variables) | set(reader.variables()))
 
         ncfiles = {}
-        for var in reader.variables():
-            logger.info(f"adding variable {var}")
-            if var in org_variables:
-                data = self.data(var)
-                if var in reader.variables():
-                    rdata = reader.data(var)
-                    if data.units != rdata.units:
-                        raise Netcdf_RWTimeseriesException(
-                            f"change of unit for variable {var} from {data.units} to {rdata.units}"
-                        )
-                    data.append(
-                        rdata.values,
-                        rdata.stations,
-                        rdata.latitudes,
-                        rdata.longitudes,
-                        rdata.altitudes,
-                        rdata.start_times,
-                        rdata.end_times,
-                        rdata.flags,
-                        rdata.standard_deviations,
-                    )
-            else:
+        try:
+            for var in reader.variables():
+                logger.info(f"adding variable {var}")
                 data = reader.data(var)
-            data = pyaro.timeseries.Filter.DuplicateFilter().filter_data(
-                data, self.stations(), self.variables()
-            )
-            min_year = (
-                np.min(data.start_times).astype("datetime64[Y]").astype(int) + 1970
-            )
-            max_year = np.max(data.end_times).astype("datetime64[Y]").astype(int) + 1970
-            for year in range(min_year, max_year + 1):
-                if not year in ncfiles:
-                    ncfiles[year] = self._tmp_ncfile(year, str(reader))
-                ydata = pyaro.timeseries.Filter.TimeBoundsFilter(
-                    startend_include=[
-                        (f"{year}-01-01 00:00:00", f"{year}-12-31 23:59:59")
-                    ]
-                ).filter_data(data, self.stations(), self.variables())
-                self._update_ncfile(ncfiles[year], year, ydata)
+                if len(data) == 0:
+                    continue
+                data = data.slice(_unique_records(data, keep))
+                # sorted by start_time to split into years
+                data = data.slice(np.argsort(data.start_times, kind="stable"))
+                for year, rec in _year_slices(data.start_times):
+                    if not year in ncfiles:
+                        ncfiles[year] = self._open_ncfile(year, str(reader), keep)
+                    self._update_ncfile(ncfiles[year], year, data.slice(rec), keep)
+        finally:
+            for nc in ncfiles.values():
+                nc.close()
 
-        # make the new files available
         for year in ncfiles:
-            ncfiles[year].close()
-            tmpfile, file = self._tmp_and_real_ncfilename(year)
-            os.rename(tmpfile, file)
-        self._write_stations()
-        self._write_json(self.metadata(), "metadata.json")
-        self._write_json(self._variables, "variables.json")
-        return
+            if self._is_year_in_filters(year):
+                self._years.add(str(year))
+        # commit the catalog, the data-files are already complete
+        self._commit_manifest()
+        if not append and ncfiles:
+            self._compact_years(ncfiles, keep)
+        return set(ncfiles)
 
     def _unfiltered_data(self, varname) -> Data:
-        data = NpStructuredData(varname, "")
-        for year in self._years:
-            file = os.path.join(self._directory, f"{self.ncfile_prefix}.{year}.nc")
+        files = []
+        for year in sorted(self._years):
+            if not self._is_year_in_filters(year, varname):
+                continue
+            file = self._ncfilename(year)
             if not os.path.exists(file):
                 logger.info(f"no datafile for {year} like {file}, skipping...")
                 continue
-            data = self._get_data_from_ncfile(varname, file, data)
+            files.append(file)
+
+        # read the years in parallel, but concatenate in order of the years
+        results = ordered_map(
+            functools.partial(self._get_data_from_ncfile, varname),
+            files,
+            self._workers,
+        )
+        results = [
+            (file, result)
+            for (file, result) in zip(files, results)
+            if result is not None
+        ]
+        if len(results) == 0:
+            return NpStructuredData(varname, "")
 
+        units = results[0][1][0]
+        for file, (file_units, _) in results:
+            if file_units != units:
+                logger.warning(
+                    f"units-change for {varname} in {file}: {file_units} != {units}"
+                )
+        data = NpStructuredData(varname, units)
+        data.append(
+            *[np.concatenate(column) for column in zip(*[r[1] for _, r in results])]
+        )
         return data
 
     def _unfiltered_stations(self) -> dict[str, Station]:
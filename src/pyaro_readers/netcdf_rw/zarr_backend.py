@@ -0,0 +1,218 @@
+"""Zarr directory stores behaving like the subset of netCDF4.Dataset used by netcdf_rw
+
+Dimensions are stored in the group attributes, and the dimension names of each
+array in its _ARRAY_DIMENSIONS attribute, as used by xarray.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    import numcodecs
+    import zarr
+except ImportError:
+    zarr = None
+
+# chunk-length of unlimited dimensions of variables created without chunksizes
+UNLIMITED_CHUNKSIZE = 1024
+
+
+class ZarrDimension:
+    def __init__(self, size, unlimited):
+        self._size = size
+        self._unlimited = unlimited
+
+    def __len__(self):
+        return self._size
+
+    def isunlimited(self):
+        return self._unlimited
+
+
+class ZarrVariable:
+    """zarr array with netCDF4.Variable-like indexing and attributes
+
+    Writing a slice beyond the end of an unlimited dimension extends the array.
+    """
+
+    def __init__(self, dataset, array):
+        object.__setattr__(self, "_dataset", dataset)
+        object.__setattr__(self, "_array", array)
+
+    @property
+    def dtype(self):
+        if self._array.dtype == object:
+            return str
+        return self._array.dtype
+
+    @property
+    def shape(self):
+        return self._array.shape
+
+    def __len__(self):
+        return self._array.shape[0]
+
+    def chunking(self):
+        return list(self._array.chunks)
+
+    def __getitem__(self, key):
+        if isinstance(key, (np.ndarray, list)):
+            return self._array.oindex[np.asarray(key)]
+        return self._array[key]
+
+    def __setitem__(self, key, values):
+        if isinstance(key, (np.ndarray, list)):
+            self._array.oindex[np.asarray(key)] = values
+            return
+        if isinstance(key, slice) and key.stop is not None:
+            dim = self._array.attrs["_ARRAY_DIMENSIONS"][0]
+            if key.stop > self._array.shape[0] and self._dataset._is_unlimited(dim):
+                self._array.resize((key.stop,) + self._array.shape[1:])
+                self._dataset._grow(dim, key.stop)
+        self._array[key] = values
+
+    def __getattr__(self, name):
+        try:
+            return self._array.attrs[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._array.attrs[name] = value
+
+
+class _ZarrVariables:
+    def __init__(self, group):
+        self._group = group
+
+    def __contains__(self, name):
+        return name in self._group
+
+
+class ZarrDataset:
+    """open a zarr directory store with the interface of netCDF4.Dataset
+
+    :param path: directory of the store
+    :param mode: 'r' for reading, 'a' for appending, 'w' for creating
+    """
+
+    def __init__(self, path, mode="r"):
+        zarr_mode = {"r": "r", "a": "r+", "w": "w"}[mode]
+        object.__setattr__(self, "_group", zarr.open_group(path, mode=zarr_mode))
+        object.__setattr__(
+            self, "_dims", dict(self._group.attrs.get("_dimensions", {}))
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def has_blosc_filter(self):
+        return True
+
+    def has_zstd_filter(self):
+        return True
+
+    @property
+    def dimensions(self) -> dict[str, ZarrDimension]:
+        return {
+            name: ZarrDimension(size, unlimited)
+            for name, (size, unlimited) in self._dims.items()
+        }
+
+    @property
+    def variables(self):
+        return _ZarrVariables(self._group)
+
+    def _is_unlimited(self, dim):
+        return self._dims[dim][1]
+
+    def _grow(self, dim, size):
+        if size > self._dims[dim][0]:
+            self._dims[dim] = [size, True]
+            self._group.attrs["_dimensions"] = self._dims
+
+    def createDimension(self, name, size=None):
+        self._dims[name] = [0 if size is None else size, size is None]
+        self._group.attrs["_dimensions"] = self._dims
+
+    def createVariable(
+        self,
+        name,
+        dtype,
+        dimensions,
+        chunksizes=None,
+        compression=None,
+        complevel=4,
+        shuffle=False,
+        significant_digits=None,
+    ) -> ZarrVariable:
+        if isinstance(dimensions, str):
+            dimensions = (dimensions,)
+        shape = tuple(self._dims[dim][0] for dim in dimensions)
+        chunks = tuple(
+            UNLIMITED_CHUNKSIZE if self._dims[dim][1] else max(1, self._dims[dim][0])
+            for dim in dimensions
+        )
+        if chunksizes is not None:
+            chunks = tuple(chunksizes) + chunks[len(chunksizes) :]
+
+        kwargs = {}
+        filters = []
+        if dtype is str:
+            dtype = object
+            kwargs["object_codec"] = numcodecs.VLenUTF8()
+        else:
+            dtype = np.dtype(dtype)
+            if significant_digits is not None and dtype.kind == "f":
+                keepbits = math.ceil(significant_digits * math.log2(10))
+                keepbits = min(keepbits, np.finfo(dtype).nmant)
+                filters.append(numcodecs.BitRound(keepbits=keepbits))
+        compressor = None
+        if compression is not None and compression.startswith("blosc"):
+            compressor = numcodecs.Blosc(
+                cname=compression[len("blosc_") :] or "lz4",
+                clevel=complevel,
+                shuffle=numcodecs.Blosc.SHUFFLE
+                if shuffle
+                else numcodecs.Blosc.NOSHUFFLE,
+            )
+        elif compression is not None:
+            if shuffle and dtype != object:
+                filters.append(numcodecs.Shuffle(elementsize=dtype.itemsize))
+            if compression == "zlib":
+                compressor = numcodecs.Zlib(level=complevel)
+            elif compression == "zstd":
+                compressor = numcodecs.Zstd(level=complevel)
+            else:
+                raise ValueError(f"unsupported compression for zarr: {compression}")
+
+        array = self._group.create_dataset(
+            name,
+            shape=shape,
+            chunks=chunks,
+            dtype=dtype,
+            compressor=compressor,
+            filters=filters or None,
+            **kwargs,
+        )
+        array.attrs["_ARRAY_DIMENSIONS"] = list(dimensions)
+        return ZarrVariable(self, array)
+
+    def __getitem__(self, name) -> ZarrVariable:
+        return ZarrVariable(self, self._group[name])
+
+    def __getattr__(self, name):
+        try:
+            return self._group.attrs[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._group.attrs[name] = value
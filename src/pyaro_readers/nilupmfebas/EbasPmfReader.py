@@ -35,13 +35,34 @@ class EbasPmfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
         tqdm_desc: str | None = None,
         filemask: str = FILE_MASK,
         vars_to_read: list[str] = None,
+        eval_flags: bool = False,
     ):
+        """Open EBAS NASA Ames files
+
+        Parameters
+        ----------
+        filename : str
+            NASA Ames file, or directory of files
+        filters : list
+            pyaro filters
+        tqdm_desc : str
+            description of the progress bar when reading a directory
+        filemask : str
+            glob of the files to read in a directory
+        vars_to_read : list
+            only read these variables
+        eval_flags : bool
+            if True, the flags of the values are derived from the EBAS flag
+            columns, and invalid values are dropped. Otherwise all values are
+            valid. Defaults to False.
+        """
         self._filters = filters
         self._stations = {}
         self._data = {}  # var -> {data-array}
         self._set_filters(filters)
         self._header = []
         self._opts = {"default": ReadEbasOptions()}
+        self._opts["default"].eval_flags = eval_flags
         self._variables = {}
         self._metadata = {}
         self._revision = datetime.datetime.min
@@ -199,19 +220,35 @@ class EbasPmfTimeseriesReader(AutoFilterReaderEngine.AutoFilterReader):
                 # we might want to put a CF compliant unit here
                 self._data[var_name] = NpStructuredData(var_name, var_unit)
 
-            # now add ts after ts
-            for t_idx, ts in enumerate(_file_dummy.start_meas):
-                self._data[var_name].append(
-                    float(_file_dummy.data[t_idx, var_idx]),  # value
-                    stat_name,
-                    lat,
-                    lon,
-                    alt,
-                    ts,
-                    _file_dummy.stop_meas[t_idx],
-                    Flag.VALID,
-                    np.nan,
-                )
+            flags = self._get_flags(_file_dummy, var_def)
+            keep = flags != Flag.INVALID
+            values = _file_dummy.data[keep, var_idx]
+            self._data[var_name].append(
+                values,
+                np.full(len(values), stat_name),
+                np.full(len(values), lat),
+                np.full(len(values), lon),
+                np.full(len(values), alt),
+                _file_dummy.start_meas[keep],
+                _file_dummy.stop_meas[keep],
+                flags[keep],
+                np.full(len(values), np.nan),
+            )
+
+    def _get_flags(self, _file_dummy: EbasNasaAmesFile, var_def) -> np.ndarray:
+        """pyaro flags of the values of a variable, from its EBAS flag column
+
+        All values are valid if flags are not evaluated, or if the variable has
+        no flag column.
+        """
+        flags = np.zeros(len(_file_dummy.data), "i4")
+        flags[:] = Flag.VALID
+        if not self._opts["default"].eval_flags or var_def.flag_col is None:
+            return flags
+        flag_col = _file_dummy.flag_col_info[var_def.flag_col]
+        flags[flag_col.below_detection] = Flag.BELOW_THRESHOLD
+        flags[~flag_col.valid] = Flag.INVALID
+        return flags
 
     def _unfiltered_data(self, varname) -> Data:
         return self._data[varname]
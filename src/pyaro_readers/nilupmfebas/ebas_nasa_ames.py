@@ -6,6 +6,7 @@ Submit-Data/Getting-started>`__
 """
 
 import csv
+import functools
 import logging
 import os
 from datetime import datetime
@@ -19,6 +20,13 @@ from .exceptions import NasaAmesReadError, TimeZoneError
 
 logger = logging.getLogger(__name__)
 
+#: valid EBAS flags marking a measured value below the detection limit
+BELOW_DETECTION_FLAGS = (147, 780, 781)
+# bits of the classes of flag codes, see _flag_class_table
+FLAG_INVALID = 1
+FLAG_BELOW_DETECTION = 2
+FLAG_CHECKED = 4
+
 
 class EbasColDef(dict):
     """Dict-like object for EBAS NASA Ames column definitions
@@ -262,6 +270,7 @@ class EbasFlagCol:
 
         self._decoded = None
         self._valid = None
+        self._below_detection = None
 
         if interpret_on_init:
             self.decode()
@@ -269,7 +278,7 @@ class EbasFlagCol:
     @property
     def FLAG_INFO(self):
         """Detailed information about EBAS flag definitions"""
-        return read_ebas_flags_file()
+        return _ebas_flags_info()
 
     @property
     def decoded(self):
@@ -285,39 +294,32 @@ class EbasFlagCol:
             self.decode()
         return self._valid
 
+    @property
+    def below_detection(self):
+        """Boolean array specifying measurements below the detection limit"""
+        if self._below_detection is None:
+            self.decode()
+        return self._below_detection
+
     def decode(self):
-        """Decode raw flag column"""
-        flags = np.zeros((len(self.raw_data), 3)).astype(int)
-        mask = self.raw_data.astype(
-            bool
-        )  # rmooves all points that are 0, i.e. that contain no flag (valid measurements)
-        valid = np.ones_like(self.raw_data).astype(bool)
-        not_ok = self.raw_data[mask]
-        if len(not_ok) > 0:
-            _decoded = []
-            _valid = []
-            for flag in not_ok:
-                item = f"{flag:.9f}".split(".")[1]
-                vals = [int(item[:3]), int(item[3:6]), int(item[6:9])]
-                _invalid = False
-                for val in vals:
-                    if val == 100:
-                        _invalid = False
-                        break  # since all other flags are irrelevant if 100 is flagged
-                    elif (
-                        val in self.FLAG_INFO["valid"]
-                        and not self.FLAG_INFO["valid"][val]
-                    ):  # is invalid
-                        _invalid = True
-
-                _decoded.append(vals)
-                _valid.append(not _invalid)
-
-            flags[mask] = np.asarray(_decoded)
-            valid[mask] = _valid
-
-        self._valid = valid
-        self._decoded = flags
+        """Decode raw flag column
+
+        The up to 3 flags of each measurement are the 3-digit groups of the 9
+        decimals of the raw value, e.g. 0.111222333 -> 111 222 333. A
+        measurement is invalid if any of its flags is invalid, unless one of
+        them is 100 (checked and valid). Missing flags (NaN) count as no flag.
+        """
+        codes = np.rint(np.asarray(self.raw_data, dtype=float) * 1e9)
+        codes[np.isnan(codes)] = 0
+        codes = codes.astype(np.int64) % 1_000_000_000
+        flags = (codes // 1_000_000, codes // 1000 % 1000, codes % 1000)
+        # one lookup of the class of each flag, combined per measurement
+        table = _flag_class_table()
+        classes = table[flags[0]] | table[flags[1]] | table[flags[2]]
+
+        self._valid = ((classes & FLAG_CHECKED) != 0) | ((classes & FLAG_INVALID) == 0)
+        self._below_detection = (classes & FLAG_BELOW_DETECTION) != 0
+        self._decoded = np.column_stack(flags)
 
 
 class EbasNasaAmesFile(NasaAmesHeader):
@@ -630,11 +632,9 @@ class EbasNasaAmesFile(NasaAmesHeader):
         """
         logger.info(f"Reading NASA Ames file:\n{nasa_ames_file}")
         lc = 0  # line counter
-        dc = 0  # data block line counter
         mc = 0  # meta block counter
         end_var_def = np.nan  # will be set (info stored in header)
         in_data = False
-        data = []
         self.file = nasa_ames_file
         try:
             with open(self.file) as fh:
@@ -647,14 +647,8 @@ class EbasNasaAmesFile(NasaAmesHeader):
                 return
 
         for line in lines:
-            if in_data:  # in data block (end of file)
-                try:
-                    data.append(tuple(float(x.strip()) for x in line.strip().split()))
-                except Exception as e:
-                    logger.warning(
-                        f"EbasNasaAmesFile: Failed to read data row {dc}. Reason: {e}"
-                    )
-                dc += 1
+            if in_data:  # in data block (end of file), parsed in bulk below
+                break
             elif (
                 lc < self._NUM_FIXLINES
             ):  # in header section (before column definitions)
@@ -722,7 +716,7 @@ class EbasNasaAmesFile(NasaAmesHeader):
                 mc += 1
             lc += 1
 
-        data = np.asarray(data)
+        data = self._read_data_block(lines[lc:])
 
         data[:, 1:] = data[:, 1:] * np.asarray(self.mul_factors)
 
@@ -747,6 +741,48 @@ class EbasNasaAmesFile(NasaAmesHeader):
         if quality_check:
             self._quality_check()
 
+    def _read_data_block(self, lines):
+        """Parse the lines of the data block into a 2D float array
+
+        The block is parsed in bulk by the C tokenizer of :func:`numpy.loadtxt`.
+        Only if that fails, the rows are parsed one by one, and malformed rows
+        are reported and skipped.
+
+        Parameters
+        ----------
+        lines : list
+            lines of the data block, i.e. after the header lines
+
+        Returns
+        -------
+        ndarray
+            data table with one column per column of the data header
+        """
+        num_cols = len(self._data_header)
+        if not any(line.strip() for line in lines):
+            # loadtxt would warn about empty input
+            return np.empty((0, num_cols), dtype=float)
+        try:
+            data = np.loadtxt(lines, dtype=float, ndmin=2)
+            if data.shape[1] == num_cols:
+                return data
+        except ValueError:
+            pass
+        data = []
+        for dc, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                row = tuple(float(x) for x in line.split())
+                if len(row) != num_cols:
+                    raise ValueError(f"{len(row)} instead of {num_cols} columns")
+                data.append(row)
+            except Exception as e:
+                logger.warning(
+                    f"EbasNasaAmesFile: Failed to read data row {dc}. Reason: {e}"
+                )
+        return np.asarray(data, dtype=float).reshape(-1, num_cols)
+
     def _read_vardef_line(self, line_from_file):
         """Import variable definition line from NASA Ames file"""
         lineX = line_from_file.replace(", ", ",")  # avoid two-char delimiters
@@ -805,7 +841,30 @@ class EbasNasaAmesFile(NasaAmesHeader):
         return s
 
 
-def read_ebas_flags_file(ebas_flags_csv: None):
+@functools.lru_cache(maxsize=None)
+def _ebas_flags_info():
+    """flag info of the ebas_flags.csv of this package, read once per process"""
+    return read_ebas_flags_file(None)
+
+
+@functools.lru_cache(maxsize=None)
+def _flag_class_table():
+    """lookup table of the flag codes 0-999 to a combination of the bits
+    FLAG_INVALID, FLAG_BELOW_DETECTION and FLAG_CHECKED
+
+    Flags not in ebas_flags.csv, and 0 for no flag, are valid.
+    """
+    table = np.zeros(1000, dtype=np.uint8)
+    for num, isvalid in _ebas_flags_info()["valid"].items():
+        if not isvalid:
+            table[num] |= FLAG_INVALID
+    table[list(BELOW_DETECTION_FLAGS)] |= FLAG_BELOW_DETECTION
+    table[100] |= FLAG_CHECKED
+    table.flags.writeable = False
+    return table
+
+
+def read_ebas_flags_file(ebas_flags_csv=None):
     """Reads file ebas_flags.csv
 
     Parameters
@@ -0,0 +1,47 @@
+import concurrent.futures
+import contextlib
+import logging
+import os
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+
+def ordered_map(func, items, workers=1, progress=None) -> list:
+    """Apply func to all items, using a pool of worker-processes if workers > 1.
+
+    netCDF4/HDF5 is not thread-safe, so processes are used rather than threads, and
+    each process opens its own file-handles. The results are returned in the order
+    of the items, independent of the order the workers finish.
+
+    :param func: picklable function, e.g. a module function, a method of a picklable
+        object or a functools.partial of those
+    :param items: iterable of single arguments to func
+    :param workers: number of worker processes, None or 0 meaning os.cpu_count(),
+        defaults to 1, i.e. no pool
+    :param progress: description of a tqdm progress-bar of the finished items,
+        defaults to None, i.e. no progress-bar
+    :return: list of results
+    """
+    items = list(items)
+    if not workers:
+        workers = os.cpu_count()
+    workers = min(workers, len(items))
+    with contextlib.ExitStack() as stack:
+        if workers <= 1:
+            results = map(func, items)
+        else:
+            logger.debug(f"running {len(items)} tasks on {workers} processes")
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            )
+            results = executor.map(func, items)
+        return list(
+            tqdm(
+                results,
+                desc=progress,
+                total=len(items),
+                disable=True if progress is None else None,
+            )
+        )
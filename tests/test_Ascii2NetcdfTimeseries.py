@@ -1,9 +1,18 @@
 import os
+import pickle
+import tempfile
 import unittest
+
+import netCDF4
 import numpy as np
 
 import pyaro
 import pyaro.timeseries
+from pyaro_readers.netcdf_helpers import (
+    NcFileCache,
+    decode_cf_times,
+    time_index_range,
+)
 
 EBAS_URL = file = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), "testdata", "NILU"
@@ -54,3 +63,191 @@ class TestAscii2NetcdfTimeSeriesReader(unittest.TestCase):
             )  # one day (21.05. with extreme SO2)
 
             self.assertIn("revision", ts.metadata())
+
+    def test_4read_sparse(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[], sparse=False
+        ) as ts:
+            dense_data = ts.data("sulphur_dioxide_in_air")
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[], sparse=True
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertEqual(len(data), len(dense_data))
+            self.assertTrue(np.all(data.values == dense_data.values))
+            self.assertTrue(np.all(data.stations == dense_data.stations))
+            self.assertTrue(np.all(data.start_times == dense_data.start_times))
+
+    def test_5read_parallel(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            serial_data = ts.data("sulphur_dioxide_in_air")
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[], workers=2
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertEqual(len(data), len(serial_data))
+            self.assertTrue(np.all(data.values == serial_data.values))
+            self.assertTrue(np.all(data.start_times == serial_data.start_times))
+
+    def test_6read_timeslice(self):
+        time_bounds = {
+            "startend_include": [("2021-05-17 00:00:00", "2021-05-24 00:00:00")]
+        }
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            all_data = ts.data("sulphur_dioxide_in_air")
+            all_data = pyaro.timeseries.filters.get(
+                "time_bounds", **time_bounds
+            ).filter_data(all_data, ts.stations(), ts.variables())
+        with pyaro.open_timeseries(
+            self.engine,
+            EBAS_URL,
+            resolution="daily",
+            filters={"time_bounds": time_bounds},
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertGreater(len(data), 0)
+            self.assertEqual(len(data), len(all_data))
+            self.assertGreaterEqual(
+                np.min(data.start_times), np.datetime64("2021-05-17 00:00:00")
+            )
+            self.assertLessEqual(
+                np.max(data.end_times), np.datetime64("2021-05-24 00:00:00")
+            )
+
+    def test_7read_station_subset(self):
+        stations = {"include": ["AM0001", "NO0002"]}
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            all_data = ts.data("sulphur_dioxide_in_air")
+            all_data = pyaro.timeseries.filters.get("stations", **stations).filter_data(
+                all_data, ts.stations(), ts.variables()
+            )
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters={"stations": stations}
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertEqual(set(data.stations), {"AM0001", "NO0002"})
+            self.assertEqual(len(data), len(all_data))
+            self.assertTrue(np.all(data.values == all_data.values))
+
+    def test_8read_times(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertEqual(data.start_times.dtype, np.dtype("datetime64[s]"))
+            self.assertTrue(
+                np.all(data.end_times - data.start_times == np.timedelta64(1, "D"))
+            )
+
+    def test_9station_blocks(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            (nstations, ntimes) = (400, 24 * 366)
+            max_rows = ts.SPARSE_BLOCK_CELLS // ntimes
+            valid_stations = np.ones(nstations, dtype=bool)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                with netCDF4.Dataset(os.path.join(tmpdir, "blocks.nc"), "w") as nc:
+                    nc.createDimension("station", nstations)
+                    nc.createDimension("time", ntimes)
+                    # a whole number of station-chunks, or capped at max_rows
+                    for chunksizes, block_rows in [
+                        ((nstations, 1), max_rows),
+                        ((10, ntimes), max_rows - max_rows % 10),
+                    ]:
+                        var = nc.createVariable(
+                            f"var{chunksizes[0]}",
+                            "f4",
+                            ("station", "time"),
+                            chunksizes=chunksizes,
+                        )
+                        blocks = list(ts._station_blocks(var, valid_stations))
+                        sizes = [b.stop - b.start for b in blocks]
+                        self.assertEqual(sum(sizes), nstations)
+                        self.assertEqual(max(sizes), block_rows)
+                        self.assertLessEqual(max(sizes) * ntimes, ts.SPARSE_BLOCK_CELLS)
+
+    def test_10file_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = [os.path.join(tmpdir, f"file{i}.nc") for i in range(3)]
+            for file in files:
+                netCDF4.Dataset(file, "w").close()
+            cache = NcFileCache(maxsize=2)
+            handles = [cache.get(file) for file in files]
+            self.assertEqual(len(cache), 2)
+            self.assertFalse(handles[0].isopen())
+            self.assertTrue(handles[1].isopen() and handles[2].isopen())
+            # reusing a file makes it the most recently used one
+            self.assertIs(cache.get(files[1]), handles[1])
+            cache.get(files[0])
+            self.assertFalse(handles[2].isopen())
+            self.assertTrue(handles[1].isopen())
+            cache.close()
+            self.assertEqual(len(cache), 0)
+            self.assertFalse(handles[1].isopen())
+
+    def test_11file_cache_reuse(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            self.assertEqual(ts._ncfiles._maxsize, ts.MAX_OPEN_FILES)
+            data = ts.data("sulphur_dioxide_in_air")
+            handles = dict(ts._ncfiles._handles)
+            catalog = dict(ts._catalog)
+            self.assertEqual(len(handles), 2)
+            data2 = ts.data("sulphur_dioxide_in_air")
+            self.assertTrue(np.all(data.values == data2.values))
+            # no file has been reopened and no header re-read
+            self.assertEqual(handles.keys(), ts._ncfiles._handles.keys())
+            for file, nc in handles.items():
+                self.assertIs(ts._ncfiles._handles[file], nc)
+                self.assertIs(ts._catalog[file], catalog[file])
+        # close() releases all handles
+        self.assertEqual(len(ts._ncfiles), 0)
+        for nc in handles.values():
+            self.assertFalse(nc.isopen())
+
+    def test_12pickle_without_handles(self):
+        with pyaro.open_timeseries(
+            self.engine, EBAS_URL, resolution="daily", filters=[]
+        ) as ts:
+            data = ts.data("sulphur_dioxide_in_air")
+            self.assertGreater(len(ts._ncfiles), 0)
+            ts2 = pickle.loads(pickle.dumps(ts))
+            self.assertEqual(len(ts2._ncfiles), 0)
+            self.assertGreater(len(ts._ncfiles), 0)
+            data2 = ts2.data("sulphur_dioxide_in_air")
+            self.assertTrue(np.all(data.values == data2.values))
+            ts2.close()
+
+    def test_13decode_noleap_times(self):
+        # day 59 of a noleap year is the 1. March also in leap-years
+        times = decode_cf_times(
+            np.array([0, 58.5, 59, 365]), "days since 2004-01-01 00:00:00", "noleap"
+        )
+        self.assertEqual(times.dtype, np.dtype("datetime64[s]"))
+        self.assertEqual(
+            times.tolist(),
+            np.array(
+                [
+                    "2004-01-01 00:00:00",
+                    "2004-02-28 12:00:00",
+                    "2004-03-01 00:00:00",
+                    "2005-01-01 00:00:00",
+                ],
+                dtype="datetime64[s]",
+            ).tolist(),
+        )
+        envelope = (
+            np.datetime64("2004-02-29 00:00:00"),
+            np.datetime64("2004-12-31 00:00:00"),
+        )
+        self.assertEqual(time_index_range(times, times, envelope), slice(2, 3))
+        with self.assertRaises(ValueError):
+            decode_cf_times(np.array([0, 59]), "days since 2004-01-01", "360_day")
@@ -1,9 +1,17 @@
 import unittest
 import os
+import tempfile
+import warnings
+
+import numpy as np
 
 import pyaro
 import pyaro.timeseries
-from pyaro_readers.nilupmfebas.ebas_nasa_ames import read_ebas_flags_file
+from pyaro_readers.nilupmfebas.ebas_nasa_ames import (
+    EbasFlagCol,
+    EbasNasaAmesFile,
+    read_ebas_flags_file,
+)
 
 
 class TestPMFEBASTimeSeriesReader(unittest.TestCase):
@@ -76,6 +84,87 @@ class TestPMFEBASTimeSeriesReader(unittest.TestCase):
         assert isinstance(dummy["info"], dict)
         assert isinstance(dummy["vals"], dict)
 
+    def test_4malformed_data_row(self):
+        org = EbasNasaAmesFile(self.file)
+        with open(self.file) as fh:
+            lines = fh.readlines()
+        # break the 3rd row of the data block
+        row = org.num_head_lines + 2
+        lines[row] = lines[row].replace(" ", " x", 1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, os.path.basename(self.file))
+            with open(file, "w") as fh:
+                fh.writelines(lines)
+            with self.assertLogs(
+                "pyaro_readers.nilupmfebas.ebas_nasa_ames", level="WARNING"
+            ) as logs:
+                broken = EbasNasaAmesFile(file)
+        self.assertIn("Failed to read data row 2", "".join(logs.output))
+        self.assertEqual(broken.data.shape, (org.data.shape[0] - 1, org.data.shape[1]))
+        self.assertTrue(
+            (broken.data[2:] == org.data[3:])[~np.isnan(org.data[3:])].all()
+        )
+
+    def test_5decode_flags(self):
+        # 456 is invalid, 781 valid, 999 missing and 100 overrides invalid flags
+        raw = np.array([0, 0.1, 0.456, 0.456100, 0.999, 0.781, 0.781456, np.nan])
+        flags = EbasFlagCol(raw_data=raw)
+        self.assertEqual(
+            flags.decoded.tolist(),
+            [
+                [0, 0, 0],
+                [100, 0, 0],
+                [456, 0, 0],
+                [456, 100, 0],
+                [999, 0, 0],
+                [781, 0, 0],
+                [781, 456, 0],
+                [0, 0, 0],
+            ],
+        )
+        self.assertEqual(
+            flags.valid.tolist(), [True, True, False, True, False, True, False, True]
+        )
+        self.assertEqual(
+            flags.below_detection.tolist(),
+            [False, False, False, False, False, True, True, False],
+        )
+
+        ebas_file = EbasNasaAmesFile(self.file)
+        self.assertGreater(len(ebas_file.flag_col_info), 0)
+        for flag in ebas_file.flag_col_info.values():
+            self.assertEqual(flag.decoded.shape, (len(ebas_file.data), 3))
+
+    def test_6eval_flags(self):
+        with pyaro.open_timeseries(self.engine, self.testdata_dir, filters=[]) as ts:
+            all_data = {var: ts.data(var) for var in ts.variables()}
+        with pyaro.open_timeseries(
+            self.engine, self.testdata_dir, filters=[], eval_flags=True
+        ) as ts:
+            flagged = {var: ts.data(var) for var in ts.variables()}
+
+        total = sum(len(data) for data in all_data.values())
+        flags = np.concatenate([data.flags for data in flagged.values()])
+        self.assertLess(len(flags), total)
+        self.assertNotIn(pyaro.timeseries.Flag.INVALID, flags)
+        self.assertIn(pyaro.timeseries.Flag.BELOW_THRESHOLD, flags)
+        for data in all_data.values():
+            self.assertTrue((data.flags == pyaro.timeseries.Flag.VALID).all())
+
+    def test_7empty_data_block(self):
+        org = EbasNasaAmesFile(self.file)
+        with open(self.file) as fh:
+            lines = fh.readlines()[: org.num_head_lines] + ["\n"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, os.path.basename(self.file))
+            with open(file, "w") as fh:
+                fh.writelines(lines)
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                # without time stamps, which are not available for empty files
+                empty = EbasNasaAmesFile(file, convert_timestamps=False)
+        self.assertEqual(empty.data.shape, (0, org.data.shape[1]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,13 @@
 import unittest
+import numpy as np
 import pyaro
 import pyaro.timeseries
 import cfunits
+import json
 import os
+import shutil
+import tempfile
+from unittest import mock
 
 
 class TestHARPReader(unittest.TestCase):
@@ -20,6 +25,14 @@ class TestHARPReader(unittest.TestCase):
     test_vars = ["PM10_density", "CO_volume_mixing_ratio", "PM2p5_density"]
     test_units = ["ug m-3", "ppm", "ug m-3"]
 
+    def _copy_testfiles(self, tmpdir):
+        """copy the sinca test-files of two stations to tmpdir"""
+        for name in (
+            "sinca-surface-157-999999-001.nc",
+            "sinca-surface-220-999999-001.nc",
+        ):
+            shutil.copy(os.path.join(os.path.dirname(self.file), name), tmpdir)
+
     def test_1read(self):
         with pyaro.open_timeseries(
             self.engine,
@@ -55,6 +68,148 @@ class TestHARPReader(unittest.TestCase):
         else:
             pass
 
+    def test_3read_all_variables(self):
+        with pyaro.open_timeseries(self.engine, self.file) as ts:
+            self.assertGreaterEqual(len(ts.variables()), len(self.test_vars))
+            lengths = set(len(ts.data(var)) for var in ts.variables())
+            self.assertEqual(len(lengths), 1)
+            self.assertNotIn("latitude", ts.variables())
+            for station in ts.stations().values():
+                self.assertIsInstance(station.latitude, float)
+
+    def test_4parallel_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._copy_testfiles(tmpdir)
+            # unreadable files are skipped
+            with open(
+                os.path.join(tmpdir, "sinca-surface-000-999999-001.nc"), "w"
+            ) as fh:
+                fh.write("no netcdf")
+            with pyaro.open_timeseries(
+                self.engine, tmpdir, vars_to_read=self.test_vars
+            ) as ts, pyaro.open_timeseries(
+                self.engine, tmpdir, vars_to_read=self.test_vars, workers=2
+            ) as ts_parallel:
+                self.assertEqual(len(ts.stations()), 2)
+                self.assertEqual(ts.stations().keys(), ts_parallel.stations().keys())
+                for var in self.test_vars:
+                    data = ts.data(var)
+                    data_parallel = ts_parallel.data(var)
+                    self.assertEqual(len(data), len(data_parallel))
+                    self.assertTrue(
+                        np.array_equal(data.stations, data_parallel.stations)
+                    )
+                    self.assertTrue(
+                        np.array_equal(data.values, data_parallel.values, True)
+                    )
+
+    def test_5catalog(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._copy_testfiles(tmpdir)
+            with pyaro.open_timeseries(self.engine, tmpdir) as ts:
+                variables = sorted(ts.variables())
+                data = ts.data(self.test_vars[0])
+                revision = ts.metadata()["revision"]
+            index_file = os.path.join(tmpdir, ts.CATALOG_FILE)
+            for _ in range(2):
+                with pyaro.open_timeseries(self.engine, tmpdir, catalog=True) as ts:
+                    self.assertTrue(os.path.exists(index_file))
+                    self.assertEqual(sorted(ts.variables()), variables)
+                    self.assertEqual(len(ts.stations()), 2)
+                    self.assertEqual(ts.metadata()["revision"], revision)
+                    # data is only loaded when requested
+                    self.assertEqual(len(ts._data), 0)
+                    # files are decoded in workers without the catalog
+                    state = ts.__getstate__()
+                    self.assertIsNone(state["_catalog"])
+                    self.assertEqual(state["_stations"], {})
+                    catalog_data = ts.data(self.test_vars[0])
+                    self.assertEqual(list(ts._data), [self.test_vars[0]])
+                    self.assertTrue(
+                        np.array_equal(data.values, catalog_data.values, True)
+                    )
+                    self.assertTrue(
+                        np.array_equal(data.stations, catalog_data.stations)
+                    )
+            with open(index_file) as fh:
+                index = json.load(fh)
+            # changed files are scanned again
+            index["files"]["sinca-surface-220-999999-001.nc"]["variables"] = {}
+            with open(index_file, "w") as fh:
+                json.dump(index, fh)
+            with pyaro.open_timeseries(self.engine, tmpdir, catalog=True) as ts:
+                self.assertEqual(len(ts.stations()), 1)
+            os.utime(os.path.join(tmpdir, "sinca-surface-220-999999-001.nc"))
+            with pyaro.open_timeseries(self.engine, tmpdir, catalog=True) as ts:
+                self.assertEqual(len(ts.stations()), 2)
+
+    def test_6time_window(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # the catalog index is written next to the file
+            file = shutil.copy(self.file, tmpdir)
+            var = self.test_vars[0]
+            with pyaro.open_timeseries(self.engine, file) as ts:
+                data = ts.data(var)
+            (start, end) = (data.start_times[100], data.end_times[200])
+            expected = (data.start_times >= start) & (data.end_times <= end)
+            time_bounds = {
+                "startend_include": [
+                    (
+                        str(start.astype("datetime64[s]")).replace("T", " "),
+                        str(end.astype("datetime64[s]")).replace("T", " "),
+                    )
+                ]
+            }
+            for catalog in (False, True):
+                with pyaro.open_timeseries(
+                    self.engine,
+                    file,
+                    filters={"time_bounds": time_bounds},
+                    catalog=catalog,
+                ) as ts:
+                    window_data = ts.data(var)
+                    self.assertEqual(len(window_data), np.sum(expected))
+                    self.assertTrue(
+                        np.array_equal(window_data.values, data.values[expected], True)
+                    )
+            # files outside the time-window are not read
+            time_bounds = {
+                "startend_include": [("1990-01-01 00:00:00", "1990-12-31 00:00:00")]
+            }
+            with pyaro.open_timeseries(
+                self.engine, file, filters={"time_bounds": time_bounds}, catalog=True
+            ) as ts:
+                self.assertEqual(len(ts.stations()), 1)
+                self.assertEqual(len(ts.data(var)), 0)
+
+    def test_7catalog_vars_to_read(self):
+        (var, other_var) = self.test_vars[:2]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._copy_testfiles(tmpdir)
+            with pyaro.open_timeseries(
+                self.engine, tmpdir, vars_to_read=[var]
+            ) as ts, pyaro.open_timeseries(
+                self.engine, tmpdir, vars_to_read=[var], catalog=True
+            ) as ts_catalog:
+                self.assertEqual(ts.variables(), [var])
+                self.assertEqual(ts_catalog.variables(), ts.variables())
+                self.assertEqual(ts_catalog.stations().keys(), ts.stations().keys())
+                data = ts.data(var)
+                catalog_data = ts_catalog.data(var)
+                self.assertTrue(np.array_equal(data.stations, catalog_data.stations))
+                self.assertTrue(np.array_equal(data.values, catalog_data.values, True))
+                # variables not to read are neither read nor available
+                with mock.patch.object(
+                    ts_catalog,
+                    "_read_single_file",
+                    wraps=ts_catalog._read_single_file,
+                ) as read_single_file:
+                    for reader in (ts, ts_catalog):
+                        with self.assertRaises(KeyError):
+                            reader._unfiltered_data(other_var)
+                    read_single_file.assert_not_called()
+                self.assertEqual(list(ts_catalog._data), [var])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,18 +1,31 @@
+import concurrent.futures
+import glob
+import importlib.util
 import logging
 import os
 from shutil import rmtree
 import sys
 import unittest
+from unittest import mock
+
+import netCDF4
 import numpy as np
 
 import pyaro
 import pyaro.timeseries
+from pyaro_readers.netcdf_rw import Netcdf_RWTimeseries
 
 EBAS_URL = file = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), "testdata", "NILU"
 )
 
 
+def _add_csv(storedir, csv_file):
+    with pyaro.open_timeseries("netcdf_rw", storedir, mode="w") as ts_rw:
+        with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+            ts_rw.add(ts)
+
+
 class TestNetcdf_RWTimeSeries(unittest.TestCase):
     engine = "ascii2netcdf"
     rwengine = "netcdf_rw"
@@ -73,3 +86,348 @@ class TestNetcdf_RWTimeSeries(unittest.TestCase):
                 ts_rw.add(ts)
                 self.assertEqual(len(ts.variables()), len(ts_rw.variables()))
                 self.assertEqual(len(ts.stations()), len(ts_rw.stations()))
+
+    def test_4read_parallel(self):
+        with pyaro.open_timeseries(self.rwengine, self.rwdir, filters=[]) as ts_rw:
+            serial_data = ts_rw.data("sulphur_dioxide_in_air")
+        with pyaro.open_timeseries(
+            self.rwengine, self.rwdir, filters=[], workers=2
+        ) as ts_rw:
+            data = ts_rw.data("sulphur_dioxide_in_air")
+            self.assertGreater(len(data), 0)
+            self.assertEqual(len(data), len(serial_data))
+            self.assertTrue(np.all(data.values == serial_data.values))
+            self.assertTrue(np.all(data.start_times == serial_data.start_times))
+
+    def test_5read_timeslice(self):
+        time_bounds = {
+            "startend_include": [("2021-05-17 00:00:00", "2021-05-24 00:00:00")]
+        }
+        with pyaro.open_timeseries(self.rwengine, self.rwdir, filters=[]) as ts_rw:
+            all_data = ts_rw.data("sulphur_dioxide_in_air")
+            all_data = pyaro.timeseries.filters.get(
+                "time_bounds", **time_bounds
+            ).filter_data(all_data, ts_rw.stations(), ts_rw.variables())
+        with pyaro.open_timeseries(
+            self.rwengine, self.rwdir, filters={"time_bounds": time_bounds}
+        ) as ts_rw:
+            data = ts_rw.data("sulphur_dioxide_in_air")
+            self.assertGreater(len(data), 0)
+            self.assertEqual(len(data), len(all_data))
+
+    def test_6append(self):
+        time_bounds = {
+            "startend_include": [("2021-05-17 00:00:00", "2021-05-24 00:00:00")]
+        }
+        with pyaro.open_timeseries(self.rwengine, self.rwdir, filters=[]) as ts_rw:
+            org_data = ts_rw.data("sulphur_dioxide_in_air")
+        with pyaro.open_timeseries(
+            self.rwengine, self.rwdir, mode="w", filters=[]
+        ) as ts_rw:
+            # appending already existing records does not add anything
+            with pyaro.open_timeseries(
+                self.engine,
+                EBAS_URL,
+                resolution="daily",
+                filters={"time_bounds": time_bounds},
+            ) as ts:
+                ts_rw.add(ts)
+            data = ts_rw.data("sulphur_dioxide_in_air")
+            self.assertEqual(len(data), len(org_data))
+
+            ts_rw.compact()
+            data = ts_rw.data("sulphur_dioxide_in_air")
+            self.assertEqual(len(data), len(org_data))
+            # compacted years are sorted by station and start_time
+            for station in np.unique(data.stations):
+                start_times = data.start_times[data.stations == station]
+                self.assertTrue(np.all(np.diff(start_times) > np.timedelta64(0)))
+
+    def _storedir(self, name):
+        """empty data-dir for netcdf_rw below rwdir"""
+        storedir = os.path.join(self.rwdir, name)
+        os.makedirs(storedir, exist_ok=True)
+        return storedir
+
+    def _csv_file(self, name, values, start="2021-03-01"):
+        """csv-file below rwdir with daily SOx values at NO0002 from start"""
+        csvdir = os.path.join(self.rwdir, "csv")
+        os.makedirs(csvdir, exist_ok=True)
+        file = os.path.join(csvdir, f"{name}.csv")
+        day = np.timedelta64(1, "D")
+        with open(file, "w") as fh:
+            for i, value in enumerate(values):
+                start_time = np.datetime64(start, "s") + i * day
+                end_time = start_time + day
+                fh.write(
+                    f"SOx,NO0002,10.0,60.0,{value},ug,"
+                    + f"{start_time.astype(object)},{end_time.astype(object)}\n"
+                )
+        return file
+
+    def test_7keep_duplicates(self):
+        storedir = self._storedir("keep")
+        old_csv = self._csv_file("old", [1.0, 1.0])
+        new_csv = self._csv_file("new", [2.0, 2.0, 2.0])
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", old_csv) as ts:
+                ts_rw.add(ts)
+            with pyaro.open_timeseries("csv_timeseries", new_csv) as ts:
+                ts_rw.add(ts)
+                data = ts_rw.data("SOx")
+                self.assertEqual(len(data), 3)
+                self.assertEqual(np.sum(data.values == 1.0), 2)
+                ts_rw.add(ts, keep="newest")
+                data = ts_rw.data("SOx")
+                self.assertEqual(len(data), 3)
+                self.assertTrue(np.all(data.values == 2.0))
+
+    def test_8year_split(self):
+        storedir = self._storedir("years")
+        csv_file = self._csv_file("years", [1.0, 2.0, 3.0], start="2020-12-31")
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+                ts_rw.add(ts)
+            # records are stored in the year of their start_time
+            files = list(ts_rw.iterate_files())
+            self.assertEqual(len(files), 2)
+            self.assertEqual(len(ts_rw.data("SOx")), 3)
+        # compressed with zlib by default, readable without filter plugins
+        with netCDF4.Dataset(files[0]) as nc:
+            filters = nc["values_0"].filters()
+            self.assertTrue(filters["zlib"])
+            self.assertFalse(filters.get("zstd") or filters.get("blosc"))
+
+    def test_9layout(self):
+        storedir = self._storedir("layout")
+        values = [1.23456, 2.34567, 3.45678, 4.56789]
+        csv_file = self._csv_file("layout", values)
+        with pyaro.open_timeseries(
+            self.rwengine,
+            storedir,
+            mode="w",
+            chunksize=2,
+            compression="zlib",
+            significant_digits=3,
+        ) as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+                ts_rw.add(ts)
+            data = ts_rw.data("SOx")
+            self.assertEqual(len(data), len(values))
+            self.assertTrue(np.all(data.stations == "NO0002"))
+            self.assertTrue(np.allclose(data.values, values, rtol=1e-3))
+            self.assertFalse(np.all(data.values == np.array(values, dtype="f")))
+        # record-ranges are merged by the chunking of the file, not of the reader
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_rw:
+            with mock.patch.object(
+                Netcdf_RWTimeseries,
+                "_merge_ranges",
+                wraps=Netcdf_RWTimeseries._merge_ranges,
+            ) as merge_ranges:
+                self.assertEqual(len(ts_rw.data("SOx")), len(values))
+            self.assertEqual(merge_ranges.call_args.args[2], 2)
+
+    def test_10parallel_writers(self):
+        storedir = self._storedir("parallel")
+        csv_files = [
+            self._csv_file(f"parallel{month}", [month] * 10, start=f"2021-0{month}-01")
+            for month in range(1, 5)
+        ]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(_add_csv, [storedir] * len(csv_files), csv_files))
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_rw:
+            data = ts_rw.data("SOx")
+            self.assertEqual(len(data), 40)
+            self.assertEqual(sorted(np.unique(data.values)), [1, 2, 3, 4])
+
+    def test_11manifest(self):
+        storedir = self._storedir("manifest")
+        csv_file = self._csv_file("manifest", [1.0, 2.0, 3.0], start="2020-12-30")
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+                ts_rw.add(ts)
+        self.assertTrue(os.path.exists(os.path.join(storedir, "manifest.json")))
+        self.assertFalse(os.path.exists(os.path.join(storedir, "variables.json")))
+
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_rw:
+            self.assertEqual(ts_rw.variables(), ["SOx"])
+            self.assertIn("NO0002", ts_rw.stations())
+            self.assertIn("revision", ts_rw.metadata())
+        # the record of 2020-12-31 is stored in 2020, but ends in 2021
+        time_bounds = {"end_include": [("2021-01-01 00:00:00", "2021-01-01 00:00:00")]}
+        with pyaro.open_timeseries(
+            self.rwengine, storedir, filters={"time_bounds": time_bounds}
+        ) as ts_rw:
+            data = ts_rw.data("SOx")
+            self.assertEqual(len(data), 1)
+            self.assertEqual(data.values[0], 2.0)
+        # data-dirs without manifest, i.e. with unversioned yearly files, take the
+        # revision from the history of the files
+        os.remove(os.path.join(storedir, "manifest.json"))
+        for file in glob.glob(os.path.join(storedir, "*.v1.nc")):
+            os.rename(file, file.replace(".v1.nc", ".nc"))
+        with pyaro.open_timeseries(self.rwengine, storedir, workers=2) as ts_rw:
+            revision = ts_rw.metadata()["revision"]
+            self.assertNotEqual(revision, "010101000000")
+            self.assertEqual(ts_rw.metadata()["revision"], revision)
+
+    def test_12add_stream(self):
+        storedir = self._storedir("stream")
+        csv_files = [
+            self._csv_file(f"stream{year}", [year] * 5, start=f"{year}-06-01")
+            for year in range(2019, 2022)
+        ]
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            ts_rw.add_stream(
+                pyaro.open_timeseries("csv_timeseries", csv_file)
+                for csv_file in csv_files + csv_files[:1]
+            )
+            self.assertEqual(len(list(ts_rw.iterate_files())), 3)
+            data = ts_rw.data("SOx")
+            self.assertEqual(len(data), 15)
+            self.assertEqual(sorted(np.unique(data.values)), [2019, 2020, 2021])
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "zarr not installed")
+    def test_13zarr_backend(self):
+        time_bounds = {
+            "startend_include": [("2020-12-01 00:00:00", "2021-01-31 00:00:00")]
+        }
+        variable = "sulphur_dioxide_in_air"
+        zarrdir = self._storedir("zarr")
+        ncdir = self._storedir("zarr2nc")
+        with pyaro.open_timeseries(
+            self.engine,
+            EBAS_URL,
+            resolution="daily",
+            filters={"time_bounds": time_bounds},
+        ) as ts:
+            org_data = ts.data(variable)
+            with pyaro.open_timeseries(
+                self.rwengine, zarrdir, mode="w", backend="zarr"
+            ) as ts_zarr:
+                ts_zarr.add(ts)
+                # appended duplicates are removed again by compaction
+                ts_zarr.add(ts)
+                ts_zarr.compact()
+        with pyaro.open_timeseries(self.rwengine, zarrdir) as ts_zarr:
+            files = list(ts_zarr.iterate_files())
+            self.assertEqual(len(files), 2)
+            self.assertTrue(all(os.path.isdir(file) for file in files))
+            # add() and compaction write new versions, only the versions of the
+            # current and the previous commit are kept
+            self.assertTrue(all(file.endswith(".v3.zarr") for file in files))
+            self.assertEqual(
+                sorted(glob.glob(os.path.join(zarrdir, "*.zarr"))),
+                sorted(files + [file.replace(".v3.", ".v2.") for file in files]),
+            )
+            with self.assertRaises(Exception):
+                pyaro.open_timeseries(self.rwengine, zarrdir, backend="netcdf")
+            with pyaro.open_timeseries(self.rwengine, ncdir, mode="w") as ts_nc:
+                ts_nc.add(ts_zarr)
+                for data in (ts_zarr.data(variable), ts_nc.data(variable)):
+                    self.assertEqual(len(data), len(org_data))
+                    self.assertEqual(data.units, org_data.units)
+                    self.assertTrue(
+                        np.array_equal(
+                            np.sort(data.values), np.sort(org_data.values), True
+                        )
+                    )
+                    self.assertEqual(
+                        sorted(zip(data.stations, data.start_times)),
+                        sorted(zip(org_data.stations, org_data.start_times)),
+                    )
+
+    def test_14add_without_append(self):
+        storedir = self._storedir("noappend")
+        streamdir = self._storedir("noappend_stream")
+        old_csv = self._csv_file("noappend_old", [1.0, 1.0, 1.0])
+        new_csv = self._csv_file("noappend_new", [2.0] * 5, start="2021-02-27")
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            for csv_file in (old_csv, new_csv):
+                with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+                    ts_rw.add(ts, append=False)
+        with pyaro.open_timeseries(self.rwengine, streamdir, mode="w") as ts_rw:
+            ts_rw.add_stream(
+                (
+                    pyaro.open_timeseries("csv_timeseries", csv_file)
+                    for csv_file in (old_csv, new_csv)
+                ),
+                append=False,
+            )
+        for directory in (storedir, streamdir):
+            with pyaro.open_timeseries(self.rwengine, directory) as ts_rw:
+                data = ts_rw.data("SOx")
+                self.assertEqual(len(data), 5)
+                self.assertEqual(np.sum(data.values == 1.0), 3)
+                self.assertTrue(np.all(np.diff(data.start_times) > np.timedelta64(0)))
+                (file,) = ts_rw.iterate_files()
+            # all records are sorted into the index
+            with netCDF4.Dataset(file) as nc:
+                self.assertEqual(
+                    nc["index_offsets_0"].indexed_records, len(nc["start_times_0"])
+                )
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "zarr not installed")
+    def test_15zarr_rewrite_before_commit(self):
+        storedir = self._storedir("zarr_rewrite")
+        csv_file = self._csv_file("zarr_rewrite", [1.0, 2.0, 3.0])
+        with pyaro.open_timeseries(
+            self.rwengine, storedir, mode="w", backend="zarr"
+        ) as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", csv_file) as ts:
+                ts_rw.add(ts)
+            (org_file,) = ts_rw.iterate_files()
+            # a writer interrupted after rewriting a year, but before the commit
+            with ts_rw._locked():
+                ts_rw._compact_year("2021")
+            with pyaro.open_timeseries(self.rwengine, storedir) as ts_reader:
+                self.assertEqual(list(ts_reader.iterate_files()), [org_file])
+                self.assertEqual(len(ts_reader.data("SOx")), 3)
+            self.assertEqual(len(glob.glob(os.path.join(storedir, "*.zarr"))), 2)
+            ts_rw.compact()
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_reader:
+            (file,) = ts_reader.iterate_files()
+            self.assertTrue(file.endswith(".v2.zarr"))
+            self.assertEqual(
+                sorted(glob.glob(os.path.join(storedir, "*.zarr"))), [org_file, file]
+            )
+            self.assertEqual(len(ts_reader.data("SOx")), 3)
+
+    def test_16read_during_add(self):
+        storedir = self._storedir("read_during_add")
+        _add_csv(storedir, self._csv_file("read_during_add_old", [1.0, 1.0, 1.0]))
+        new_csv = self._csv_file("read_during_add_new", [2.0] * 5)
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            with pyaro.open_timeseries("csv_timeseries", new_csv) as ts:
+                with ts_rw._locked():
+                    # a writer in the middle of add(), replacing and appending
+                    nc = ts_rw._open_ncfile(2021, str(ts), "newest")
+                    try:
+                        ts_rw._update_ncfile(nc, 2021, ts.data("SOx"), "newest")
+                        with pyaro.open_timeseries(
+                            self.rwengine, storedir
+                        ) as ts_reader:
+                            data = ts_reader.data("SOx")
+                            self.assertEqual(list(data.values), [1.0] * 3)
+                    finally:
+                        nc.close()
+                ts_rw.add(ts, keep="newest")
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_reader:
+            self.assertEqual(list(ts_reader.data("SOx").values), [2.0] * 5)
+
+    def test_17uncommitted_rows(self):
+        storedir = self._storedir("uncommitted")
+        _add_csv(storedir, self._csv_file("uncommitted_old", [1.0, 1.0, 1.0]))
+        # same records as the new ones, but not committed
+        left_csv = self._csv_file("uncommitted_left", [99.0, 99.0], start="2021-03-04")
+        new_csv = self._csv_file("uncommitted_new", [2.0, 2.0], start="2021-03-04")
+        with pyaro.open_timeseries(self.rwengine, storedir, mode="w") as ts_rw:
+            (file,) = ts_rw.iterate_files()
+            # rows left in the yearly file by a writer interrupted before the commit
+            with pyaro.open_timeseries("csv_timeseries", left_csv) as ts:
+                with netCDF4.Dataset(file, "a") as nc:
+                    ts_rw._append_ncvariable(nc, 0, ts.data("SOx"), 3)
+            with pyaro.open_timeseries("csv_timeseries", new_csv) as ts:
+                ts_rw.add(ts)
+        with pyaro.open_timeseries(self.rwengine, storedir) as ts_rw:
+            self.assertEqual(list(ts_rw.data("SOx").values), [1.0] * 3 + [2.0] * 2)